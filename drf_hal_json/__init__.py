@@ -1,13 +1,62 @@
+import django
 from django.conf import settings
 
+if django.VERSION < (3, 2):
+    default_app_config = 'drf_hal_json.apps.DrfHalJsonConfig'
+
 USER_SETTINGS = getattr(settings, "REST_HAL", {})
 
 URL_FIELD_NAME = USER_SETTINGS.get("URL_FIELD_NAME", "self")
 LINKS_FIELD_NAME = USER_SETTINGS.get("LINKS_FIELD_NAME", "_links")
 EMBEDDED_FIELD_NAME = USER_SETTINGS.get("EMBEDDED_FIELD_NAME", "_embedded")
+URL_TEMPLATES = USER_SETTINGS.get("URL_TEMPLATES", False)
+JSON_BACKEND = USER_SETTINGS.get("JSON_BACKEND", "json")
+PAGINATION_COUNT = USER_SETTINGS.get("PAGINATION_COUNT", "exact")
+PAGINATION_COUNT_ESTIMATOR = USER_SETTINGS.get("PAGINATION_COUNT_ESTIMATOR", "drf_hal_json.pagination.estimate_count")
+PAGINATION_COUNT_CACHE = USER_SETTINGS.get("PAGINATION_COUNT_CACHE", "default")
+PAGINATION_COUNT_CACHE_TIMEOUT = USER_SETTINGS.get("PAGINATION_COUNT_CACHE_TIMEOUT", 300)
+REPRESENTATION_CACHE = USER_SETTINGS.get("REPRESENTATION_CACHE", "default")
+REPRESENTATION_CACHE_TIMEOUT = USER_SETTINGS.get("REPRESENTATION_CACHE_TIMEOUT", 300)
+FIELD_SELECTION = USER_SETTINGS.get("FIELD_SELECTION", False)
+FIELDS_QUERY_PARAM = USER_SETTINGS.get("FIELDS_QUERY_PARAM", "fields")
+EMBED_QUERY_PARAM = USER_SETTINGS.get("EMBED_QUERY_PARAM", "embed")
+LINKS_QUERY_PARAM = USER_SETTINGS.get("LINKS_QUERY_PARAM", "links")
+CURIES = USER_SETTINGS.get("CURIES", [])
+RELATIVE_HREFS = USER_SETTINGS.get("RELATIVE_HREFS", False)
+EMBEDDED_IDENTITY_MAP = USER_SETTINGS.get("EMBEDDED_IDENTITY_MAP", False)
+INSTRUMENTATION = USER_SETTINGS.get("INSTRUMENTATION", False)
+STATS_SINK = USER_SETTINGS.get("STATS_SINK", None)
+SERVER_TIMING = USER_SETTINGS.get("SERVER_TIMING", True)
 
 HAL_JSON_MEDIA_TYPE = "application/hal+json"
 
 
 def is_hal_content_type(content_type):
-    return content_type in (HAL_JSON_MEDIA_TYPE, HAL_JSON_MEDIA_TYPE + "; charset=UTF-8")
+    """
+    Whether the media type of `content_type` (e.g. a Content-Type header) is HAL JSON, with a UTF-8 charset if any
+    """
+    if not content_type:
+        return False
+    media_type, _, params = content_type.partition(';')
+    if media_type.strip().lower() != HAL_JSON_MEDIA_TYPE:
+        return False
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            return value.strip().strip('"').lower().replace('-', '') == 'utf8'
+    return True
+
+
+def compact_href(request, href):
+    """
+    Return `href` relative to the host of `request` (i.e. starting with its path) if RELATIVE_HREFS is enabled
+    """
+    if not RELATIVE_HREFS or request is None or not href:
+        return href
+    try:
+        host_url = request._hal_host_url
+    except AttributeError:
+        host_url = request._hal_host_url = request.build_absolute_uri('/')[:-1]
+    if href.startswith(host_url + '/'):
+        return href[len(host_url):]
+    return href
@@ -0,0 +1,124 @@
+"""
+Async counterparts of the HAL list serializer and view mixins, for ASGI deployments with Django >= 4.1
+(async ORM) and async capable views, e.g. the viewsets of adrf:
+
+    class ResourceViewSet(AsyncHalRetrieveModelMixin, AsyncHalListModelMixin, adrf.viewsets.GenericViewSet):
+        serializer_class = ResourceSerializer
+        queryset = Resource.objects.all()
+
+Objects are fetched with `aiterator()`/`aget()`, the lookups prefetched by the queryset are prefetched afterwards,
+serialization runs in the thread of the request's database connection (`sync_to_async`) and HAL bodies are
+rendered in a worker thread, so the event loop is never blocked.
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet, prefetch_related_objects
+from django.http import Http404
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
+
+from drf_hal_json.renderers import JsonHalRenderer
+from drf_hal_json.serializers import HalListSerializer
+
+
+async def aprefetch_related_objects(objects, lookups):
+    """
+    Prefetch `lookups` for `objects` in the thread of the request's database connection
+    """
+    if objects and lookups:
+        await sync_to_async(prefetch_related_objects)(objects, *lookups)
+
+
+async def afetch(queryset):
+    """
+    Return the objects of `queryset` as a list, fetched with the async ORM
+    """
+    lookups = queryset._prefetch_related_lookups
+    if lookups:
+        queryset = queryset.prefetch_related(None)
+    objects = [obj async for obj in queryset.aiterator()]
+    await aprefetch_related_objects(objects, lookups)
+    return objects
+
+
+async def aserialize(serializer):
+    """
+    Return the `data` of `serializer`, fetching the objects of a list serializer's queryset with the async ORM
+    """
+    if isinstance(serializer, ListSerializer) and isinstance(serializer.instance, QuerySet):
+        serializer.instance = await afetch(serializer.instance)
+    # fields may still query related objects, on the connection of the request
+    return await sync_to_async(lambda: serializer.data)()
+
+
+async def arender(renderer, data, accepted_media_type=None, renderer_context=None):
+    """
+    Render `data` with `renderer` in a worker thread
+    """
+    return await sync_to_async(renderer.render, thread_sensitive=False)(data, accepted_media_type, renderer_context)
+
+
+class AsyncHalListSerializer(HalListSerializer):
+    """
+    `HalListSerializer` whose data can be awaited with `adata()`
+    """
+
+    async def adata(self):
+        return await aserialize(self)
+
+
+class AsyncHalViewMixin(object):
+    """
+    Base of the async view mixins: serializes with the async ORM and renders HAL responses in a worker thread
+    """
+
+    async def aserialize(self, serializer):
+        return await aserialize(serializer)
+
+    async def arender_response(self, response):
+        """
+        Finalize `response` and render it in a worker thread if it's rendered by `JsonHalRenderer`,
+        later finalizations and renderings of the view keep the rendered content
+        """
+        response = self.finalize_response(self.request, response)
+        if isinstance(getattr(response, 'accepted_renderer', None), JsonHalRenderer):
+            await sync_to_async(response.render, thread_sensitive=False)()
+        return response
+
+
+class AsyncHalListModelMixin(AsyncHalViewMixin):
+    async def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        # paginators count and slice synchronously
+        page = await sync_to_async(self.paginate_queryset)(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(await self.aserialize(serializer))
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = Response(await self.aserialize(serializer))
+        return await self.arender_response(response)
+
+
+class AsyncHalRetrieveModelMixin(AsyncHalViewMixin):
+    async def retrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance)
+        return await self.arender_response(Response(await self.aserialize(serializer)))
+
+    async def aget_object(self):
+        """
+        `get_object` with the async ORM
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        lookups = queryset._prefetch_related_lookups
+        try:
+            obj = await queryset.prefetch_related(None).aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        await aprefetch_related_objects([obj], lookups)
+        # permissions may query the database
+        await sync_to_async(self.check_object_permissions)(self.request, obj)
+        return obj
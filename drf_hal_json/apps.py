@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+
+
+class DrfHalJsonConfig(AppConfig):
+    name = 'drf_hal_json'
+    verbose_name = 'HAL JSON'
+
+    def ready(self):
+        # serializer classes created later are connected by their metaclass
+        from drf_hal_json.caching import connect_signals
+        from drf_hal_json.serializers import HalModelSerializer
+
+        serializer_classes = [HalModelSerializer]
+        while serializer_classes:
+            serializer_class = serializer_classes.pop()
+            connect_signals(serializer_class)
+            serializer_classes.extend(serializer_class.__subclasses__())
@@ -0,0 +1,182 @@
+"""
+Per-object cache of HAL representations, enabled per serializer with the `cache_representation` Meta option:
+
+    class Meta:
+        model = Resource
+        fields = ('self', 'name', 'related')
+        cache_representation = True
+        cache_version_field = 'updated'  # optional, becomes part of the key
+        cache_timeout = 600  # optional, defaults to REPRESENTATION_CACHE_TIMEOUT
+
+Representations are stored in the `REPRESENTATION_CACHE` cache, keyed by the serializer class, its field names,
+the generations of the models its query plan reads from (the serialized model and the embedded or selected related
+models), the object's pk and version and the host of the request.
+
+The generation of a model changes when one of its objects is saved or deleted, or when one of its many-to-many
+relations changes. The signal receivers are only connected for the models read by serializers which cache their
+representations, when the serializer classes are created (or when the `drf_hal_json` app is loaded, for classes
+created before), so every process which imports the serializers invalidates the shared cache, whether it
+serializes them or not. Data read by `SerializerMethodField`s or model properties from other models is not tracked.
+"""
+import hashlib
+import uuid
+import weakref
+
+from django.core.cache import caches
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+from drf_hal_json import REPRESENTATION_CACHE, REPRESENTATION_CACHE_TIMEOUT
+from drf_hal_json.queries import _SerializerWalker
+
+
+def invalidate_model(model):
+    """
+    Invalidate the cached representations of all serializer classes which depend on `model`
+    """
+    caches[REPRESENTATION_CACHE].delete(
+        HalRepresentationCache.generation_key_prefix + model._meta.concrete_model._meta.label)
+
+
+def _invalidate_on_change(sender, **kwargs):
+    invalidate_model(sender)
+
+
+def _invalidate_on_m2m_change(sender, instance, action, model, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_model(sender)
+        invalidate_model(instance.__class__)
+        invalidate_model(model)
+
+
+# serializer classes whose models are connected
+_connected_serializers = weakref.WeakSet()
+
+
+def connect_signals(serializer_class):
+    """
+    Connect the signal receivers invalidating the representations of `serializer_class` to the models of its
+    query plan, if it caches its representations
+    """
+    meta = getattr(serializer_class, 'Meta', None)
+    if (not getattr(meta, 'cache_representation', False) or getattr(meta, 'model', None) is None
+            or serializer_class in _connected_serializers):
+        return
+    _connected_serializers.add(serializer_class)
+    for model in HalRepresentationCache.get_models(meta.model, serializer_class.get_query_plan()):
+        label = model._meta.label
+        post_save.connect(_invalidate_on_change, sender=model, dispatch_uid='drf_hal_json.post_save:' + label)
+        post_delete.connect(_invalidate_on_change, sender=model, dispatch_uid='drf_hal_json.post_delete:' + label)
+        # sent by the through models of many-to-many relations
+        m2m_changed.connect(_invalidate_on_m2m_change, sender=model, dispatch_uid='drf_hal_json.m2m_changed:' + label)
+
+
+class HalRepresentationCache(object):
+    generation_key_prefix = 'drf_hal_json:generation:'
+    key_prefix = 'drf_hal_json:representation:'
+
+    def __init__(self, serializer_class):
+        meta = serializer_class.Meta
+        model = meta.model
+        self.label = '{}.{}:{}'.format(serializer_class.__module__, serializer_class.__qualname__, model._meta.label)
+        self.version_field = getattr(meta, 'cache_version_field', None)
+        self.timeout = getattr(meta, 'cache_timeout', REPRESENTATION_CACHE_TIMEOUT)
+        self.generation_keys = sorted({
+            self.generation_key_prefix + dependency._meta.concrete_model._meta.label
+            for dependency in self.get_models(model, serializer_class.get_query_plan())})
+
+    @staticmethod
+    def get_models(model, plan):
+        """
+        Return the serialized model and the related models reached by the relations of `plan`
+        """
+        models = {model}
+        for path in plan.select_related + plan.prefetch_related:
+            related_model = model
+            for attr in path.split('__'):
+                relation = _SerializerWalker.get_relation(related_model, attr)
+                if relation is None:
+                    break
+                related_model = relation.related_model
+                models.add(related_model)
+                if relation.many_to_many:
+                    through = getattr(relation, 'through', None) or relation.remote_field.through
+                    models.add(through)
+        return models
+
+    @property
+    def cache(self):
+        return caches[REPRESENTATION_CACHE]
+
+    def get_generation(self):
+        """
+        Return the generations of the models the representations depend on
+        """
+        generations = self.cache.get_many(self.generation_keys)
+        missing = [key for key in self.generation_keys if key not in generations]
+        if missing:
+            for key in missing:
+                self.cache.add(key, uuid.uuid4().hex, None)
+            generations.update(self.cache.get_many(missing))
+        return ','.join(generations.get(key, '') for key in self.generation_keys)
+
+    def get_key_prefix(self, serializer):
+        """
+        The part of the keys which is the same for all objects serialized by `serializer`, computed once per
+        serializer instance (i.e. request)
+        """
+        try:
+            return serializer._representation_key_prefix
+        except AttributeError:
+            request = serializer.context.get('request')
+            host = request.build_absolute_uri('/') if request is not None else ''
+            # the field types tell embedded resources from the links they may be demoted to
+            fields = ','.join('{}:{}'.format(field_name, type(field).__name__)
+                              for field_name, field in serializer.fields.items())
+            serializer._representation_key_prefix = '\n'.join([self.label, fields, self.get_generation(), host])
+            return serializer._representation_key_prefix
+
+    def get_key(self, serializer, instance):
+        if instance.pk is None:
+            return None
+        version = getattr(instance, self.version_field) if self.version_field else ''
+        key = '\n'.join([self.get_key_prefix(serializer), str(instance.pk), str(version)])
+        return self.key_prefix + hashlib.md5(key.encode()).hexdigest()
+
+    def get(self, serializer, instance):
+        key = self.get_key(serializer, instance)
+        representation = self.cache.get(key) if key is not None else None
+        if representation is None:
+            representation = serializer.build_representation(instance)
+            if key is not None:
+                self.cache.set(key, to_plain(representation), self.timeout)
+        return representation
+
+    def get_many(self, serializer, instances):
+        keys = [self.get_key(serializer, instance) for instance in instances]
+        cached = self.cache.get_many([key for key in keys if key is not None])
+        representations = []
+        missing = {}
+        for key, instance in zip(keys, instances):
+            representation = cached.get(key) if key is not None else None
+            if representation is None:
+                representation = serializer.build_representation(instance)
+                if key is not None:
+                    missing[key] = to_plain(representation)
+            representations.append(representation)
+        if missing:
+            self.cache.set_many(missing, self.timeout)
+        return representations
+
+
+def to_plain(value):
+    """
+    Convert a representation to plain dicts, lists and strings which can be pickled by the cache backends,
+    e.g. `Hyperlink`s (which reference the linked object) to `str`
+    """
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    if isinstance(value, str) and type(value) is not str:
+        return str(value)
+    return value
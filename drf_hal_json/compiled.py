@@ -0,0 +1,90 @@
+"""
+Compiled representations, enabled per serializer with the `compile_representation` Meta option:
+
+    class Meta:
+        model = Resource
+        fields = ('self', 'name', 'size', 'related')
+        compile_representation = True
+
+The fields of a serializer are compiled once per serializer instance into a closure, which is reused for every
+object the serializer (or its list serializer) represents. The option applies to the embedded serializers too,
+unless they set it to False.
+
+* Fields reading a column of the model (a single `source` attribute which is a concrete, non-relational model
+  field) are read with `getattr` and converted with their `to_representation` (or `str`/`int` for char and integer
+  fields), skipping `get_attribute` and its `SkipField` handling.
+* Hyperlinked fields build their URLs from URL templates (see `HalUrlTemplateMixin`), which reverse every view
+  name only once, unless they set `url_templates` themselves.
+
+The links and embedded resources are placed like without the option. All other fields, and objects which are
+mappings, are serialized like without the option, so the representations are identical.
+"""
+from collections.abc import Mapping
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.fields import CharField, Field, IntegerField, empty
+
+from drf_hal_json.fields import HalUrlTemplateMixin
+
+
+def get_column_attribute(model, field):
+    """
+    Return the attribute of `model` that `field` reads, if the attribute is a column and `field` reads it
+    like `getattr` does, otherwise None
+    """
+    if type(field).get_attribute is not Field.get_attribute or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source_attrs[0])
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.is_relation:
+        return None
+    return field.source_attrs[0]
+
+
+def get_converter(field):
+    to_representation = type(field).to_representation
+    if to_representation is CharField.to_representation:
+        return str
+    if to_representation is IntegerField.to_representation:
+        return int
+    return field.to_representation
+
+
+def compile_representation(serializer):
+    """
+    Return a function building the representation of an object like `serializer.build_representation` does
+    """
+    build_representation = serializer._build_representation
+    link_fields, embedded_fields, state_fields = serializer.bound_layout
+
+    for field_name, field, properties in link_fields:
+        relation = getattr(field, 'child_relation', field)
+        # fields are bound to this serializer instance, fields which set `url_templates` keep it
+        if isinstance(relation, HalUrlTemplateMixin) and 'url_templates' not in vars(relation):
+            relation.url_templates = True
+
+    # (field name, field, column attribute, converter), the converter is None for fields serialized as usual
+    compiled_state_fields = []
+    for field_name, field in state_fields:
+        attribute = get_column_attribute(serializer.Meta.model, field)
+        converter = get_converter(field) if attribute is not None else None
+        compiled_state_fields.append((field_name, field, attribute, converter))
+
+    def serialize_state(instance, ret, serialize_field):
+        for field_name, field, attribute, converter in compiled_state_fields:
+            if converter is None:
+                val = serialize_field(field, instance)
+                if val is not empty:
+                    ret[field_name] = val
+            else:
+                val = getattr(instance, attribute)
+                ret[field_name] = None if val is None else converter(val)
+
+    def represent(instance):
+        if isinstance(instance, Mapping):
+            return build_representation(instance)
+        return build_representation(instance, serialize_state)
+
+    return represent
@@ -1,5 +1,73 @@
+import functools
+import operator
+import re
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import NoReverseMatch, Resolver404, get_resolver, get_script_prefix, get_urlconf, resolve
+from django.utils.encoding import uri_to_iri
+from django.utils.translation import get_language
 from rest_framework import serializers
-from rest_framework.relations import Hyperlink
+from rest_framework.relations import MANY_RELATION_KWARGS, Hyperlink, ManyRelatedField
+
+from drf_hal_json import URL_TEMPLATES, compact_href
+
+# lookup values which `reverse()` would neither reject nor quote, so they can be filled into a URL template
+TEMPLATE_SAFE_LOOKUP_VALUE = re.compile(r'^[A-Za-z0-9_\-]+$')
+# values reversed in place of the lookup value to find its position in the URL
+URL_TEMPLATE_PLACEHOLDERS = ('7281939164528374', 'halurltemplateplaceholder')
+
+try:
+    from django.urls.converters import IntConverter, PathConverter, SlugConverter, StringConverter, UUIDConverter
+    # path converters whose `to_url` returns the lookup value as it is, so it can be filled into a URL template
+    IDENTITY_CONVERTERS = (IntConverter, PathConverter, SlugConverter, StringConverter, UUIDConverter)
+except ImportError:  # Django < 2.0, without path converters
+    IDENTITY_CONVERTERS = ()
+
+# optional link properties of the HAL spec which can be read from the linked instance, see `HalLinkObjectMixin`
+LINK_PROPERTY_NAMES = ('title', 'templated', 'type', 'deprecation', 'name')
+
+
+def link_property_getter(path):
+    """
+    Return a getter for the (dotted) attribute `path`, which returns None if an intermediate object is None
+    """
+    if '.' not in path:
+        return operator.attrgetter(path)
+    attrs = path.split('.')
+
+    def get_property(instance):
+        for attr in attrs:
+            if instance is None:
+                return None
+            instance = getattr(instance, attr)
+        return instance
+    return get_property
+
+
+def resolve_path(path, urlconf=None):
+    """
+    `resolve()` with a cache, for incoming documents linking the same resources many times.
+    Returns None for paths which don't resolve.
+    """
+    # the patterns of `i18n_patterns` depend on the active language
+    return _resolve_path(path, urlconf, get_language())
+
+
+@functools.lru_cache(maxsize=4096)
+def _resolve_path(path, urlconf, language):
+    try:
+        return resolve(path, urlconf)
+    except Resolver404:
+        return None
+
+
+@receiver(setting_changed)
+def clear_resolve_path_cache(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        _resolve_path.cache_clear()
 
 
 class HalIncludeInLinksMixin(object):
@@ -18,7 +86,7 @@ class HalHyperlinkedPropertyField(HalIncludeInLinksMixin, serializers.Field):
     def to_representation(self, obj):
         val = self.process_value(obj) if self.process_value else obj
         if 'request' in self.context:
-            val = self.context['request'].build_absolute_uri(val)
+            val = compact_href(self.context['request'], self.context['request'].build_absolute_uri(val))
         return Hyperlink(val, val)
 
     def to_internal_value(self, data):
@@ -45,66 +113,219 @@ class HalContributeToLinkField(serializers.SerializerMethodField):
         super(HalContributeToLinkField, self).__init__(**kwargs)
 
 
-class HalHyperlinkedRelatedField(HalIncludeInLinksMixin, serializers.HyperlinkedRelatedField):
-
-    def __init__(self, **kwargs):
-        self.title_field = kwargs.pop('title_field', None)
-        self.templated_field = kwargs.pop('templated_field', None)
-        self.type_field = kwargs.pop('type_field', None)
-        self.deprecation_field = kwargs.pop('deprecation_field', None)
-        self.name_field = kwargs.pop('name_field', None)
-        super(HalHyperlinkedRelatedField, self).__init__(**kwargs)
+class HalRelativeUrlMixin(object):
+    """
+    Mixin for hyperlinked fields which renders URLs relative to the host with the `RELATIVE_HREFS` setting
+    """
+
+    def get_url(self, obj, view_name, request, format):
+        return compact_href(request, super(HalRelativeUrlMixin, self).get_url(obj, view_name, request, format))
+
+
+class HalUrlTemplateMixin(object):
+    """
+    Mixin for hyperlinked fields which, with `url_templates` enabled, reverses every view name only once per
+    request and builds the URLs of all objects by filling their lookup value into the resolved URL.
+    Views whose URLs can't be templated, and lookup values that would need quoting, fall back to `reverse()`.
+    """
+    url_templates = URL_TEMPLATES
+
+    def __init__(self, *args, **kwargs):
+        # set on the instance only if given, see `compile_representation`
+        if 'url_templates' in kwargs:
+            self.url_templates = kwargs.pop('url_templates')
+        super(HalUrlTemplateMixin, self).__init__(*args, **kwargs)
+
+    def get_url(self, obj, view_name, request, format):
+        if not self.url_templates or request is None:
+            return super(HalUrlTemplateMixin, self).get_url(obj, view_name, request, format)
+
+        # Unsaved objects will not yet have a valid URL.
+        if hasattr(obj, 'pk') and obj.pk in (None, ''):
+            return None
+
+        lookup_value = str(getattr(obj, self.lookup_field))
+        if TEMPLATE_SAFE_LOOKUP_VALUE.match(lookup_value):
+            template = self.get_url_template(view_name, request, format)
+            if template is not None:
+                return template[0] + lookup_value + template[1]
+        return super(HalUrlTemplateMixin, self).get_url(obj, view_name, request, format)
+
+    def get_url_template(self, view_name, request, format):
+        """
+        Return the (prefix, suffix) surrounding the lookup value in the URLs of `view_name`,
+        or None if they can't be templated. Templates are cached on the request.
+        """
+        try:
+            templates = request._hal_url_templates
+        except AttributeError:
+            templates = request._hal_url_templates = {}
+
+        key = (view_name, self.lookup_url_kwarg, format)
+        if key not in templates:
+            templates[key] = self.build_url_template(view_name, request, format)
+        return templates[key]
+
+    def build_url_template(self, view_name, request, format):
+        if not self.has_identity_converter(view_name):
+            return None
+        for placeholder in URL_TEMPLATE_PLACEHOLDERS:
+            try:
+                url = self.reverse(view_name, kwargs={self.lookup_url_kwarg: placeholder},
+                                   request=request, format=format)
+            except NoReverseMatch:
+                continue
+            if url.count(placeholder) == 1:
+                return tuple(url.split(placeholder))
+        return None
+
+    def has_identity_converter(self, view_name):
+        """
+        Whether the URLs of `view_name` capture the lookup value with regex groups or built-in path converters which
+        don't convert it, i.e. whether `reverse()` puts the lookup value into the URL as it is
+        """
+        resolver = get_resolver(get_urlconf())
+        *namespaces, name = view_name.split(':')
+        for namespace in namespaces:
+            if namespace not in resolver.namespace_dict:
+                return False
+            resolver = resolver.namespace_dict[namespace][1]
+        for possibility in resolver.reverse_dict.getlist(name):
+            # (possibilities, pattern, defaults, converters), without converters before Django 2.0
+            converters = possibility[3] if len(possibility) > 3 else {}
+            converter = converters.get(self.lookup_url_kwarg)
+            if converter is not None and type(converter) not in IDENTITY_CONVERTERS:
+                return False
+        return True
+
+
+class HalLinkObjectMixin(object):
+    """
+    Mixin for hyperlinked fields rendering a HAL link object, optionally with link properties
+    (`title_field`, `type_field`, ...) read from the linked instance. Property paths may be dotted.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.link_properties = []
+        for property_name in LINK_PROPERTY_NAMES:
+            path = kwargs.pop(property_name + '_field', None)
+            setattr(self, property_name + '_field', path)
+            if path:
+                self.link_properties.append((property_name, link_property_getter(path)))
+        super(HalLinkObjectMixin, self).__init__(*args, **kwargs)
+
+    def use_pk_only_optimization(self):
+        # link properties are read from the complete instance
+        return not self.link_properties and super(HalLinkObjectMixin, self).use_pk_only_optimization()
 
     def to_representation(self, instance):
-        val = {'href': super(HalHyperlinkedRelatedField, self).to_representation(instance)}
-
-        if self.title_field and getattr(instance, self.title_field):
-            val['title'] = getattr(instance, self.title_field)
-
-        if self.templated_field and getattr(instance, self.templated_field):
-            val['templated'] = getattr(instance, self.templated_field)
-
-        if self.type_field and getattr(instance, self.type_field):
-            val['type'] = getattr(instance, self.type_field)
-
-        if self.deprecation_field and getattr(instance, self.deprecation_field):
-            val['deprecation'] = getattr(instance, self.deprecation_field)
-
-        if self.name_field and getattr(instance, self.name_field):
-            val['name'] = getattr(instance, self.name_field)
-
+        val = {'href': super(HalLinkObjectMixin, self).to_representation(instance)}
+        for property_name, getter in self.link_properties:
+            prop = getter(instance)
+            if prop:
+                val[property_name] = prop
         return val
 
 
-class HalHyperlinkedIdentityField(HalIncludeInLinksMixin, serializers.HyperlinkedIdentityField):
+class HalHrefResolutionMixin(object):
+    """
+    Mixin for hyperlinked fields which resolves the hrefs of many incoming links at once: `prefetch_hrefs` fetches
+    the linked objects with one query, the following `to_internal_value` calls for these hrefs look them up.
+    Hrefs which can't be prefetched are resolved (and rejected) by `to_internal_value` as usual.
+    """
+
+    def get_href_lookup_value(self, href):
+        """
+        Return the lookup value in `href` if it is a URL of this field's view, None otherwise
+        """
+        if not isinstance(href, str):
+            return None
+        path = href
+        if href.startswith(('http:', 'https:')):
+            path = parse.urlparse(href).path
+            prefix = get_script_prefix()
+            if path.startswith(prefix):
+                path = '/' + path[len(prefix):]
+        match = resolve_path(uri_to_iri(path), get_urlconf())
+        if match is None:
+            return None
+
+        request = self.context.get('request', None)
+        try:
+            expected_viewname = request.versioning_scheme.get_versioned_viewname(self.view_name, request)
+        except AttributeError:
+            expected_viewname = self.view_name
+        if match.view_name != expected_viewname:
+            return None
+        return match.kwargs.get(self.lookup_url_kwarg)
+
+    def prefetch_hrefs(self, hrefs, queryset=None):
+        """
+        Fetch the objects linked by `hrefs` from `queryset` (default: the field's queryset) with one query.
+        Returns the prefetched objects by href.
+        """
+        try:
+            prefetched = self._prefetched_objects
+        except AttributeError:
+            prefetched = self._prefetched_objects = {}
+        if '__' in self.lookup_field:
+            return prefetched
+
+        lookup_values = {}
+        for href in hrefs:
+            lookup_value = self.get_href_lookup_value(href)
+            if lookup_value is not None and href not in prefetched:
+                lookup_values[href] = str(lookup_value)
+        if not lookup_values:
+            return prefetched
+
+        queryset = self.get_queryset() if queryset is None else queryset
+        objects = {}
+        try:
+            for obj in queryset.filter(**{self.lookup_field + '__in': set(lookup_values.values())}):
+                objects[str(getattr(obj, self.lookup_field))] = obj
+        except (TypeError, ValueError, ValidationError):
+            # invalid lookup values are reported by `to_internal_value`
+            return prefetched
+        for href, lookup_value in lookup_values.items():
+            if lookup_value in objects:
+                prefetched[href] = objects[lookup_value]
+        return prefetched
 
-    def __init__(self, **kwargs):
-        self.title_field = kwargs.pop('title_field', None)
-        self.templated_field = kwargs.pop('templated_field', None)
-        self.type_field = kwargs.pop('type_field', None)
-        self.deprecation_field = kwargs.pop('deprecation_field', None)
-        self.name_field = kwargs.pop('name_field', None)
-        super(HalHyperlinkedIdentityField, self).__init__(**kwargs)
+    def to_internal_value(self, data):
+        try:
+            return self._prefetched_objects[data]
+        except (AttributeError, KeyError, TypeError):
+            return super(HalHrefResolutionMixin, self).to_internal_value(data)
 
-    def to_representation(self, instance):
-        val = {'href': super(HalHyperlinkedIdentityField, self).to_representation(instance)}
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return HalManyRelatedField(**list_kwargs)
 
-        if self.title_field and getattr(instance, self.title_field):
-            val['title'] = getattr(instance, self.title_field)
 
-        if self.templated_field and getattr(instance, self.templated_field):
-            val['templated'] = getattr(instance, self.templated_field)
+class HalManyRelatedField(ManyRelatedField):
+    """
+    Resolves all hrefs of an incoming list of links with one query (see `HalHrefResolutionMixin`)
+    """
 
-        if self.type_field and getattr(instance, self.type_field):
-            val['type'] = getattr(instance, self.type_field)
+    def to_internal_value(self, data):
+        if isinstance(data, list) and not self.read_only:
+            self.child_relation.prefetch_hrefs(data)
+        return super(HalManyRelatedField, self).to_internal_value(data)
 
-        if self.deprecation_field and getattr(instance, self.deprecation_field):
-            val['deprecation'] = getattr(instance, self.deprecation_field)
 
-        if self.name_field and getattr(instance, self.name_field):
-            val['name'] = getattr(instance, self.name_field)
+class HalHyperlinkedRelatedField(HalIncludeInLinksMixin, HalLinkObjectMixin, HalHrefResolutionMixin,
+                                 HalRelativeUrlMixin, HalUrlTemplateMixin, serializers.HyperlinkedRelatedField):
+    pass
 
-        return val
+
+class HalHyperlinkedIdentityField(HalIncludeInLinksMixin, HalLinkObjectMixin, HalHrefResolutionMixin,
+                                  HalRelativeUrlMixin, HalUrlTemplateMixin, serializers.HyperlinkedIdentityField):
+    pass
 
 
 class HalFileField(HalIncludeInLinksMixin, serializers.FileField):
@@ -0,0 +1,255 @@
+"""
+Timings and query counts of HAL serialization and rendering, enabled with the `INSTRUMENTATION` setting:
+
+    REST_HAL = {
+        'INSTRUMENTATION': True,
+        'STATS_SINK': 'myproject.stats.StatsdSink',  # optional, a `HalStatsSink` class
+        'SERVER_TIMING': True,  # add a Server-Timing header to rendered responses (the default)
+    }
+
+Every serialization pass (the `data` of a root `HalModelSerializer` or `HalListSerializer`) records in a `HalMetrics`:
+
+* the time of the `serialize`, `db` (queries made while serializing) and `render` phases
+* the time spent per field type, for the fields which are not embedded resources
+* the time and number of queries of each embedded relation, including the resources embedded by it
+* the size of the rendered payload
+
+The metrics are sent with the `serialization_finished` and `rendering_finished` signals, reported to the stats sink
+and, for responses rendered by `JsonHalRenderer`, summarized in a `Server-Timing` header. Queries are counted with
+a database execute wrapper (Django >= 2.0) on the database the serialized model is read from.
+"""
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+from rest_framework.serializers import BaseSerializer
+
+from drf_hal_json import INSTRUMENTATION, SERVER_TIMING, STATS_SINK
+
+# sent with `serializer` and `metrics` when a serialization pass is done
+serialization_finished = Signal()
+# sent with `renderer`, `metrics` and `size` when the data of a serialization pass is rendered
+rendering_finished = Signal()
+
+
+class HalStatsSink(object):
+    """
+    Receives the metrics, with a statsd-like interface. `tags` is a dict or None.
+    """
+
+    def timing(self, name, value, tags=None):
+        """
+        Record a duration in milliseconds
+        """
+
+    def incr(self, name, value=1, tags=None):
+        """
+        Increment a counter
+        """
+
+    def gauge(self, name, value, tags=None):
+        """
+        Record a value, e.g. a size in bytes
+        """
+
+
+class InMemoryStatsSink(HalStatsSink):
+    """
+    Keeps the reported metrics as (name, value, tags) in `timings`, `counters` and `gauges`, e.g. for tests
+    """
+
+    def __init__(self):
+        self.timings = []
+        self.counters = []
+        self.gauges = []
+
+    def timing(self, name, value, tags=None):
+        self.timings.append((name, value, tags))
+
+    def incr(self, name, value=1, tags=None):
+        self.counters.append((name, value, tags))
+
+    def gauge(self, name, value, tags=None):
+        self.gauges.append((name, value, tags))
+
+    def get(self, name, tags=None):
+        """
+        Return the values reported as `name` (with `tags`)
+        """
+        return [value for metrics in (self.timings, self.counters, self.gauges)
+                for metric_name, value, metric_tags in metrics
+                if metric_name == name and (tags is None or metric_tags == tags)]
+
+    def clear(self):
+        del self.timings[:], self.counters[:], self.gauges[:]
+
+
+_stats_sinks = {}
+
+
+def get_stats_sink():
+    """
+    Return the instance of the `STATS_SINK` class, or None if not configured
+    """
+    if not STATS_SINK:
+        return None
+    if STATS_SINK not in _stats_sinks:
+        _stats_sinks[STATS_SINK] = import_string(STATS_SINK)()
+    return _stats_sinks[STATS_SINK]
+
+
+class HalMetrics(object):
+    """
+    The metrics of one serialization pass, times in seconds
+    """
+
+    def __init__(self, serializer_name):
+        self.serializer_name = serializer_name
+        self.phases = OrderedDict([('serialize', 0.0)])
+        self.field_types = defaultdict(float)
+        # relation (serializer class name and field name) -> [time, queries]
+        self.relations = OrderedDict()
+        self.queries = 0
+        self.size = None
+
+    def __repr__(self):
+        return '<HalMetrics {} phases={!r} queries={}>'.format(self.serializer_name, dict(self.phases), self.queries)
+
+    def __call__(self, execute, sql, params, many, context):
+        # the database execute wrapper, counting and timing the queries
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add_phase('db', time.perf_counter() - start)
+            self.queries += 1
+
+    def add_phase(self, phase, duration):
+        self.phases[phase] = self.phases.get(phase, 0.0) + duration
+
+    def wrap_serialize_field(self, serializer, serialize_field):
+        """
+        Return `serialize_field` of `serializer`, recording the time per field type and per embedded relation
+        """
+        serializer_name = type(serializer).__name__
+
+        def timed_serialize_field(field, instance):
+            queries = self.queries
+            start = time.perf_counter()
+            try:
+                return serialize_field(field, instance)
+            finally:
+                duration = time.perf_counter() - start
+                if isinstance(field, BaseSerializer):
+                    relation = self.relations.setdefault('{}.{}'.format(serializer_name, field.field_name), [0.0, 0])
+                    relation[0] += duration
+                    relation[1] += self.queries - queries
+                else:
+                    self.field_types[type(field).__name__] += duration
+
+        return timed_serialize_field
+
+    def get_tags(self):
+        return {'serializer': self.serializer_name}
+
+    def report_serialization(self, sink):
+        tags = self.get_tags()
+        for phase in ('serialize', 'db'):
+            if phase in self.phases:
+                sink.timing('hal.' + phase, self.phases[phase] * 1000, tags)
+        sink.incr('hal.queries', self.queries, tags)
+        for field_type, duration in self.field_types.items():
+            sink.timing('hal.field', duration * 1000, dict(tags, field_type=field_type))
+        for relation, (duration, queries) in self.relations.items():
+            sink.timing('hal.embedded', duration * 1000, dict(tags, relation=relation))
+            sink.incr('hal.embedded.queries', queries, dict(tags, relation=relation))
+
+    def report_rendering(self, sink):
+        tags = self.get_tags()
+        sink.timing('hal.render', self.phases['render'] * 1000, tags)
+        sink.gauge('hal.payload_size', self.size, tags)
+
+    def get_server_timing(self):
+        """
+        Return the value of a Server-Timing header for the phases
+        """
+        timings = []
+        for phase, duration in self.phases.items():
+            timing = 'hal-{};dur={:.2f}'.format(phase, duration * 1000)
+            if phase == 'db':
+                timing += ';desc="{} queries"'.format(self.queries)
+            timings.append(timing)
+        return ', '.join(timings)
+
+
+def get_serializer_model(serializer):
+    serializer = getattr(serializer, 'child', serializer)
+    return getattr(getattr(serializer, 'Meta', None), 'model', None)
+
+
+@contextmanager
+def instrument(serializer):
+    """
+    Record the `HalMetrics` of a serialization pass by the root `serializer`, which are kept as
+    `serializer._hal_metrics` while serializing and on the request of the serializer for the renderer.
+    Yields None (and records nothing) if instrumentation is disabled, `serializer` is not the root or its data
+    has already been serialized.
+    """
+    if not INSTRUMENTATION or serializer.parent is not None or hasattr(serializer, '_data'):
+        yield None
+        return
+    model = get_serializer_model(serializer)
+    connection = connections[router.db_for_read(model) if model is not None else DEFAULT_DB_ALIAS]
+    metrics = serializer._hal_metrics = HalMetrics(type(getattr(serializer, 'child', serializer)).__name__)
+    request = serializer.context.get('request')
+    if request is not None:
+        request._hal_metrics = metrics
+    try:
+        with connection.execute_wrapper(metrics):
+            start = time.perf_counter()
+            yield metrics
+            metrics.add_phase('serialize', time.perf_counter() - start)
+    finally:
+        del serializer._hal_metrics
+
+    serialization_finished.send(sender=type(serializer), serializer=serializer, metrics=metrics)
+    sink = get_stats_sink()
+    if sink is not None:
+        metrics.report_serialization(sink)
+
+
+def get_metrics(serializer):
+    """
+    Return the `HalMetrics` of the serialization pass `serializer` is part of, or None
+    """
+    return getattr(serializer.root, '_hal_metrics', None)
+
+
+def instrument_rendering(renderer, render, data, accepted_media_type, renderer_context):
+    """
+    Render with `render`, recording the time and size in the metrics of the serialization pass of the request
+    """
+    request = renderer_context.get('request') if renderer_context else None
+    metrics = getattr(request, '_hal_metrics', None)
+    if metrics is None:
+        return render(data, accepted_media_type, renderer_context)
+
+    start = time.perf_counter()
+    ret = render(data, accepted_media_type, renderer_context)
+    metrics.add_phase('render', time.perf_counter() - start)
+    metrics.size = len(ret)
+
+    response = renderer_context.get('response')
+    if SERVER_TIMING and response is not None:
+        server_timing = metrics.get_server_timing()
+        if response.has_header('Server-Timing'):
+            server_timing = response['Server-Timing'] + ', ' + server_timing
+        response['Server-Timing'] = server_timing
+    rendering_finished.send(sender=type(renderer), renderer=renderer, metrics=metrics, size=metrics.size)
+    sink = get_stats_sink()
+    if sink is not None:
+        metrics.report_rendering(sink)
+    return ret
@@ -0,0 +1,109 @@
+"""
+JSON backends for `JsonHalRenderer` and `JsonHalParser`, selected with the `JSON_BACKEND` setting:
+
+    REST_HAL = {
+        'JSON_BACKEND': ('orjson', 'ujson'),  # the first installed backend is used
+    }
+
+Objects the backends can't encode natively (Decimal, datetime, lazy strings, ...) are encoded like DRF's
+`JSONEncoder` does. Renderings a backend doesn't support (e.g. indentation other than 2 with orjson)
+and the default 'json' backend use DRF's stdlib based implementation.
+
+orjson encodes NaN and infinite floats as null, where the stdlib based renderer raises a `ValueError` with the
+`STRICT_JSON` API setting (the default) and writes `NaN`/`Infinity` without it.
+"""
+import importlib
+import warnings
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.utils.encoders import JSONEncoder
+
+# encodes the objects which are not native to JSON exactly like the stdlib based renderer
+encode_default = JSONEncoder().default
+
+
+class JsonBackend(object):
+    module_name = None
+
+    def __init__(self, module):
+        self.module = module
+
+    def supports(self, renderer, indent):
+        """
+        Whether `dumps` can render the way `renderer` would render with `indent`
+        """
+        return indent is None and renderer.compact and not renderer.ensure_ascii
+
+    def dumps(self, data, renderer, indent):
+        raise NotImplementedError()
+
+    def loads(self, content):
+        return self.module.loads(content)
+
+
+class OrjsonBackend(JsonBackend):
+    """
+    orjson has no option to reject NaN and infinite floats, it encodes them as null whether the renderer is strict
+    or not
+    """
+    module_name = 'orjson'
+
+    def supports(self, renderer, indent):
+        return indent in (None, 2) and (renderer.compact or indent) and not renderer.ensure_ascii
+
+    def dumps(self, data, renderer, indent):
+        option = self.module.OPT_NON_STR_KEYS | self.module.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= self.module.OPT_INDENT_2
+        return self.module.dumps(data, default=encode_default, option=option)
+
+
+class UjsonBackend(JsonBackend):
+    module_name = 'ujson'
+
+    def dumps(self, data, renderer, indent):
+        return self.module.dumps(
+            data, default=encode_default, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+
+class SimplejsonBackend(JsonBackend):
+    module_name = 'simplejson'
+
+    def supports(self, renderer, indent):
+        return True
+
+    def dumps(self, data, renderer, indent):
+        if indent is not None:
+            separators = (',', ': ')
+        else:
+            separators = (',', ':') if renderer.compact else (', ', ': ')
+        return self.module.dumps(
+            data, default=encode_default, indent=indent, separators=separators,
+            ensure_ascii=renderer.ensure_ascii, allow_nan=not renderer.strict,
+            use_decimal=False, namedtuple_as_object=False).encode()
+
+
+JSON_BACKENDS = {backend.module_name: backend for backend in (OrjsonBackend, UjsonBackend, SimplejsonBackend)}
+
+
+def get_json_backend(names):
+    """
+    Return the first installed backend of `names` (a name or a sequence of names),
+    or None if only the stdlib 'json' module is to be used.
+    """
+    if isinstance(names, str):
+        names = (names,)
+    for name in names:
+        if name == 'json':
+            return None
+        try:
+            backend_class = JSON_BACKENDS[name]
+        except KeyError:
+            raise ImproperlyConfigured('Unknown JSON_BACKEND "{}", choose from json, {}'.format(
+                name, ', '.join(sorted(JSON_BACKENDS))))
+        try:
+            return backend_class(importlib.import_module(backend_class.module_name))
+        except ImportError:
+            continue
+    warnings.warn('None of the JSON backends {} is installed, using json'.format(', '.join(names)))
+    return None
@@ -1,47 +1,447 @@
-from collections import OrderedDict
+import base64
+import binascii
+import hashlib
+import json
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-from rest_framework.pagination import CursorPagination, PageNumberPagination, LimitOffsetPagination
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, CursorPagination, LimitOffsetPagination, PageNumberPagination,
+                                       _positive_int)
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from rest_framework.utils.urls import replace_query_param
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param
 
-from drf_hal_json import EMBEDDED_FIELD_NAME, LINKS_FIELD_NAME
+from drf_hal_json import (PAGINATION_COUNT, PAGINATION_COUNT_CACHE, PAGINATION_COUNT_CACHE_TIMEOUT,
+                          PAGINATION_COUNT_ESTIMATOR)
+from drf_hal_json.serializers import HalDocument
 
+COUNT_EXACT = 'exact'
+COUNT_ESTIMATED = 'estimated'
+COUNT_CACHED = 'cached'
+COUNT_NONE = 'none'
 
-class HalPageNumberPagination(PageNumberPagination):
-    def get_paginated_response(self, data):
-        if self.get_next_link():
-            data[LINKS_FIELD_NAME]['next'] = {'href': self.get_next_link()}
-        if self.get_previous_link():
-            data[LINKS_FIELD_NAME]['previous'] = {'href': self.get_previous_link()}
-        template_url = replace_query_param(self.request.build_absolute_uri(), self.page_query_param, '_PAGE_')
-        data[LINKS_FIELD_NAME]['page'] = {
-            'href': template_url.replace('_PAGE_', '{?page}'),  # need this trick because of URL encoding
-            'templated': True}
-        data['count'] = self.page.paginator.count
-        data['page_size'] = self.get_page_size(self.request)
-        return Response(data)
 
+def estimate_count(queryset):
+    """
+    Estimate the number of objects in `queryset` from the statistics of the PostgreSQL query planner.
+    Returns None for other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
 
-class HalLimitOffsetPagination(LimitOffsetPagination):
-    def get_paginated_response(self, data):
-        if self.get_next_link():
-            data[LINKS_FIELD_NAME]['next'] = {'href': self.get_next_link()}
-        if self.get_previous_link():
-            data[LINKS_FIELD_NAME]['previous'] = {'href': self.get_previous_link()}
-        template_url = replace_query_param(self.request.build_absolute_uri(), self.limit_query_param, '_PAGE_')
-        data[LINKS_FIELD_NAME]['page'] = {
-            'href': template_url.replace('_PAGE_', '{?page}'),  # need this trick because of URL encoding
-            'templated': True}
-        data['count'] = self.count
-        data['page_size'] = self.get_limit(self.request)
-        return Response(data)
 
+class LookaheadPaginator(DjangoPaginator):
+    """
+    Paginator which finds out whether there is a next page by fetching one object beyond the page,
+    instead of counting all objects. `num_pages` is only known up to the page after the current one.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LookaheadPaginator, self).__init__(*args, **kwargs)
+        self.num_pages = 1
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and (number > 1 or not self.allow_empty_first_page):
+            raise EmptyPage('That page contains no results')
+        self.num_pages = number + 1 if len(objects) > self.per_page else number
+        return self._get_page(objects[:self.per_page], number, self)
+
+
+class HalCountMixin(object):
+    """
+    Counts the paginated objects according to `count_strategy`:
+
+    * 'exact': a COUNT query on every request
+    * 'estimated': `count_estimator(queryset)` (a dotted path or staticmethod), by default from the statistics
+      of the PostgreSQL planner. Estimates below
+      `count_estimate_threshold` and querysets the estimator can't handle (None) are counted exactly.
+    * 'cached': exact counts cached per query for `count_cache_timeout` seconds
+    * 'none': objects are not counted
+
+    Except for 'exact', next links are determined by fetching one object beyond the page.
+    """
+    count_strategy = PAGINATION_COUNT
+    count_estimator = PAGINATION_COUNT_ESTIMATOR
+    count_estimate_threshold = 1000
+    count_cache = PAGINATION_COUNT_CACHE
+    count_cache_timeout = PAGINATION_COUNT_CACHE_TIMEOUT
+
+    def count_objects(self, queryset):
+        if not isinstance(queryset, QuerySet):
+            return len(queryset)
+        if self.count_strategy == COUNT_EXACT:
+            return queryset.count()
+        if self.count_strategy == COUNT_NONE:
+            return None
+        if self.count_strategy == COUNT_ESTIMATED:
+            return self.get_estimated_count(queryset)
+        if self.count_strategy == COUNT_CACHED:
+            return self.get_cached_count(queryset)
+        raise ValueError('Unknown count strategy "{}"'.format(self.count_strategy))
+
+    def get_estimated_count(self, queryset):
+        estimator = self.count_estimator
+        if isinstance(estimator, str):
+            estimator = import_string(estimator)
+        count = estimator(queryset)
+        if count is None or count < self.count_estimate_threshold:
+            return queryset.count()
+        return count
+
+    def get_cached_count(self, queryset):
+        try:
+            query = str(queryset.query)
+        except EmptyResultSet:
+            return 0
+        key = 'drf_hal_json:count:' + hashlib.md5((queryset.db + query).encode()).hexdigest()
+        cache = caches[self.count_cache]
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+
+class PageUrl(object):
+    """
+    The URL of the current request, parsed once to build the URLs of other pages
+    """
+
+    def __init__(self, url, page_query_params):
+        scheme, netloc, path, query, fragment = urlsplit(url)
+        self.base_url = urlunsplit((scheme, netloc, path, '', ''))
+        self.query = [(key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+                      if key not in page_query_params]
+
+    def build(self, *params):
+        """
+        Return the URL with the page query parameters `params`, (name, value) pairs. None values are left out.
+        """
+        query = urlencode(self.query + [(name, value) for name, value in params if value is not None])
+        return self.base_url + '?' + query if query else self.base_url
+
+    def template(self, *names):
+        """
+        Return the URL as RFC 6570 template with the page query parameters `names`
+        """
+        operator = '&' if self.query else '?'
+        return self.build() + '{' + operator + ','.join(names) + '}'
+
+
+class HalPaginationMixin(object):
+    """
+    Adds the links of `get_hal_links` and the properties of `get_hal_properties` to the HAL document,
+    computing each of them once per response.
+    """
 
-class HalCursorPagination(CursorPagination):
     def get_paginated_response(self, data):
-        if self.get_next_link():
-            data[LINKS_FIELD_NAME]['next'] = {'href': self.get_next_link()}
-        if self.get_previous_link():
-            data[LINKS_FIELD_NAME]['previous'] = {'href': self.get_previous_link()}
+        # the data of a `HalListSerializer` is extended in place, other documents are wrapped
+        if not isinstance(data, HalDocument):
+            data = HalDocument(data, request=self.request, serializer=getattr(data, 'serializer', None))
+        for rel, href in self.get_hal_links():
+            if href is not None:
+                data.add_link(rel, href)
+        template = self.get_page_template()
+        if template is not None:
+            data.add_link('page', template, templated=True)
+        for name, value in self.get_hal_properties():
+            if value is not None:
+                data[name] = value
         return Response(data)
+
+    def get_hal_links(self):
+        return [('next', self.get_next_link()), ('previous', self.get_previous_link())]
+
+    def get_page_template(self):
+        return None
+
+    def get_hal_properties(self):
+        return []
+
+    def get_page_url(self):
+        try:
+            return self._page_url
+        except AttributeError:
+            self._page_url = PageUrl(self.request.build_absolute_uri(), self.get_page_query_params())
+            return self._page_url
+
+
+class HalPageNumberPagination(HalPaginationMixin, HalCountMixin, PageNumberPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.count_strategy == COUNT_EXACT:
+            results = super(HalPageNumberPagination, self).paginate_queryset(queryset, request, view)
+            self.hal_count = self.page.paginator.count if results is not None else None
+            return results
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.hal_count = self.count_objects(queryset)
+        paginator = LookaheadPaginator(queryset, page_size)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.request = request
+        return list(self.page)
+
+    def get_page_query_params(self):
+        return (self.page_query_param,)
+
+    def get_page_link(self, page_number):
+        if page_number == 1:
+            return self.get_page_url().build()
+        return self.get_page_url().build((self.page_query_param, page_number))
+
+    def get_next_link(self):
+        if not self.page.has_next():
+            return None
+        return self.get_page_link(self.page.next_page_number())
+
+    def get_previous_link(self):
+        if not self.page.has_previous():
+            return None
+        return self.get_page_link(self.page.previous_page_number())
+
+    def get_hal_links(self):
+        links = super(HalPageNumberPagination, self).get_hal_links()
+        links.append(('first', self.get_page_link(1)))
+        if self.count_strategy == COUNT_EXACT:
+            links.append(('last', self.get_page_link(self.page.paginator.num_pages)))
+        return links
+
+    def get_page_template(self):
+        return self.get_page_url().template(self.page_query_param)
+
+    def get_hal_properties(self):
+        return [('count', self.hal_count), ('page_size', self.page.paginator.per_page)]
+
+
+class HalLimitOffsetPagination(HalPaginationMixin, HalCountMixin, LimitOffsetPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.count_strategy == COUNT_EXACT:
+            results = super(HalLimitOffsetPagination, self).paginate_queryset(queryset, request, view)
+            self.hal_count = getattr(self, 'count', None)
+            return results
+
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.hal_count = self.count_objects(queryset)
+        self.offset = self.get_offset(request)
+        self.request = request
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        # the links are built by comparing offsets with `count`, which is known up to the next object
+        self.count = self.offset + len(results)
+        if len(results) > self.limit and self.template is not None:
+            self.display_page_controls = True
+        return results[:self.limit]
+
+    def get_page_query_params(self):
+        return (self.limit_query_param, self.offset_query_param)
+
+    def get_offset_link(self, offset):
+        return self.get_page_url().build(
+            (self.limit_query_param, self.limit), (self.offset_query_param, offset if offset > 0 else None))
+
+    def get_next_link(self):
+        if self.offset + self.limit >= self.count:
+            return None
+        return self.get_offset_link(self.offset + self.limit)
+
+    def get_previous_link(self):
+        if self.offset <= 0:
+            return None
+        return self.get_offset_link(self.offset - self.limit)
+
+    def get_hal_links(self):
+        links = super(HalLimitOffsetPagination, self).get_hal_links()
+        links.append(('first', self.get_offset_link(0)))
+        if self.count_strategy == COUNT_EXACT:
+            links.append(('last', self.get_offset_link((max(self.count - 1, 0) // self.limit) * self.limit)))
+        return links
+
+    def get_page_template(self):
+        return self.get_page_url().template(self.limit_query_param, self.offset_query_param)
+
+    def get_hal_properties(self):
+        return [('count', self.hal_count), ('page_size', self.limit)]
+
+
+class HalCursorPagination(HalPaginationMixin, CursorPagination):
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return super(HalCursorPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_hal_links(self):
+        links = super(HalCursorPagination, self).get_hal_links()
+        links.append(('first', remove_query_param(self.base_url, self.cursor_query_param)))
+        return links
+
+
+class HalKeysetPagination(HalPaginationMixin, BasePagination):
+    """
+    Keyset (seek) pagination: a page starts after (or ends before) the key of an object, i.e. its values of
+    the `ordering` fields, completed with the primary key to be unique. Pages are selected with a composite
+    seek predicate on the ordered columns, neither OFFSET nor COUNT queries are issued.
+
+    The ordering fields must not be nullable.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = None
+    max_page_size = None
+    ordering = '-pk'
+    after_query_param = 'after'
+    before_query_param = 'before'
+    invalid_key_message = _('Invalid key.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.hal_page_size = page_size
+        self.key_fields = self.get_key_fields(queryset.model)
+        after = self.decode_key(request.query_params.get(self.after_query_param))
+        before = self.decode_key(request.query_params.get(self.before_query_param))
+        backwards = after is None and before is not None
+        key = before if backwards else after
+
+        ordering = [(name, descending != backwards) for name, descending, field in self.key_fields]
+        queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in ordering])
+        if key is not None:
+            queryset = queryset.filter(self.get_seek_filter(ordering, key))
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if backwards:
+            results.reverse()
+
+        if backwards:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, key is not None
+        self.next_key = self.get_key(results[-1]) if results else None
+        self.previous_key = self.get_key(results[0]) if results else None
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_key_fields(self, model):
+        """
+        Return (name, descending, model field) of the ordering fields, completed with the primary key
+        """
+        ordering = (self.ordering,) if isinstance(self.ordering, str) else tuple(self.ordering)
+        key_fields = []
+        for ordering_field in ordering:
+            name = ordering_field.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            key_fields.append((field.name, ordering_field.startswith('-'), field))
+        if not any(field.primary_key for name, descending, field in key_fields):
+            key_fields.append((model._meta.pk.name, key_fields[-1][1], model._meta.pk))
+        return key_fields
+
+    def get_key(self, instance):
+        return [getattr(instance, field.attname) for name, descending, field in self.key_fields]
+
+    @staticmethod
+    def get_seek_filter(ordering, key):
+        """
+        (a, b, c) > (x, y, z) as (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        comparing with < for descending fields
+        """
+        seek_filter = Q()
+        for index, (name, descending) in enumerate(ordering):
+            condition = Q(**{'{}__{}'.format(name, 'lt' if descending else 'gt'): key[index]})
+            for equal_index, (equal_name, equal_descending) in enumerate(ordering[:index]):
+                condition &= Q(**{equal_name: key[equal_index]})
+            seek_filter |= condition
+        return seek_filter
+
+    def encode_key(self, key):
+        encoded = json.dumps(key, cls=JSONEncoder, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(encoded).decode().rstrip('=')
+
+    def decode_key(self, encoded):
+        if encoded is None:
+            return None
+        try:
+            key = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)).decode())
+            if not isinstance(key, list) or len(key) != len(self.key_fields):
+                raise ValueError()
+            return [field.to_python(value) for value, (name, descending, field) in zip(key, self.key_fields)]
+        except (TypeError, ValueError, ValidationError, binascii.Error):
+            raise NotFound(self.invalid_key_message)
+
+    def get_page_query_params(self):
+        return (self.after_query_param, self.before_query_param)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.next_key is None:
+            return self.get_page_url().build()
+        return self.get_page_url().build((self.after_query_param, self.encode_key(self.next_key)))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.previous_key is None:
+            return self.get_page_url().build()
+        return self.get_page_url().build((self.before_query_param, self.encode_key(self.previous_key)))
+
+    def get_hal_links(self):
+        links = super(HalKeysetPagination, self).get_hal_links()
+        links.append(('first', self.get_page_url().build()))
+        return links
+
+    def get_hal_properties(self):
+        return [('page_size', self.hal_page_size)]
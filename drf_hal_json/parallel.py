@@ -0,0 +1,163 @@
+"""
+Parallel serialization of lists, enabled per serializer with the `parallel_workers` Meta option:
+
+    class Meta:
+        model = Resource
+        fields = ('self', 'name', 'related')
+        parallel_workers = 8
+        parallel_executor = 'process'  # or 'thread' (the default)
+        parallel_chunk_size = 100  # objects per task (the default)
+
+The objects of a `HalListSerializer` with such a child are split into chunks which are serialized by a shared pool
+of workers and merged in order. The first chunk is serialized by the calling thread, which also caches the URL
+templates of the request (see `HalUrlTemplateMixin`) for the workers.
+
+Workers must not query the database, so the objects should be fetched with their query plan (see
+`HalQueryPlanMixin`); chunks which need queries are serialized again by the calling thread. Threads only run in
+parallel where serialization releases the GIL. Processes receive the serializer class, which must be importable,
+and a picklable context: a `HalRequestStub` of the request (scheme, host, path, query parameters, version and URL
+templates), the format and the field selection. Fields that need other context (e.g. the view) can't be serialized
+in processes.
+"""
+import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.apps import apps
+from django.db import connections
+from django.http import HttpRequest
+
+from drf_hal_json.caching import to_plain
+from drf_hal_json.selection import FIELD_SELECTION_CONTEXT_KEY
+
+DEFAULT_CHUNK_SIZE = 100
+
+# shared pools, by executor type and number of workers
+_executors = {}
+
+
+class WorkerQueryError(Exception):
+    """
+    Raised in workers instead of querying the database
+    """
+
+
+class HalRequestStub(HttpRequest):
+    """
+    Picklable stand-in for the request of a serializer, which builds the same absolute URLs
+    """
+
+    def __init__(self, request):
+        super(HalRequestStub, self).__init__()
+        http_request = getattr(request, '_request', request)
+        self._scheme = request.scheme
+        self._host = request.get_host()
+        self.method = request.method
+        self.path = request.path
+        self.path_info = request.path_info
+        self.GET = http_request.GET.copy()
+        self.META = {key: http_request.META[key] for key in ('SCRIPT_NAME', 'QUERY_STRING')
+                     if key in http_request.META}
+        self.version = getattr(request, 'version', None)
+        self.versioning_scheme = getattr(request, 'versioning_scheme', None)
+        url_templates = getattr(request, '_hal_url_templates', None)
+        if url_templates:
+            self._hal_url_templates = dict(url_templates)
+
+    def _get_scheme(self):
+        return self._scheme
+
+    def get_host(self):
+        return self._host
+
+    @property
+    def query_params(self):
+        return self.GET
+
+
+def get_parallel_options(serializer):
+    """
+    Return the (executor type, number of workers, chunk size) of `serializer`, or None if not parallel
+    """
+    meta = getattr(serializer, 'Meta', None)
+    workers = getattr(meta, 'parallel_workers', None)
+    if not workers or workers < 2:
+        return None
+    executor_type = getattr(meta, 'parallel_executor', 'thread')
+    chunk_size = getattr(meta, 'parallel_chunk_size', DEFAULT_CHUNK_SIZE)
+    return executor_type, workers, chunk_size
+
+
+def get_executor(executor_type, workers):
+    key = (executor_type, workers)
+    if key not in _executors:
+        if executor_type == 'process':
+            # Python < 3.7 has no initializers, its processes are forked (except on Windows)
+            kwargs = {'initializer': init_process} if sys.version_info >= (3, 7) else {}
+            _executors[key] = ProcessPoolExecutor(workers, **kwargs)
+        elif executor_type == 'thread':
+            kwargs = {'thread_name_prefix': 'drf_hal_json'} if sys.version_info >= (3, 6) else {}
+            _executors[key] = ThreadPoolExecutor(workers, **kwargs)
+        else:
+            raise ValueError('Unknown parallel_executor "{}", choose from process, thread'.format(executor_type))
+    return _executors[key]
+
+
+def init_process():
+    # processes which are spawned rather than forked start without the apps
+    if not apps.ready:
+        import django
+        django.setup()
+
+
+def forbid_queries(execute, sql, params, many, context):
+    raise WorkerQueryError(sql)
+
+
+def serialize_chunk(serializer_class, context, instances, plain=False):
+    """
+    Serialize `instances` with a new `serializer_class` in a worker, without querying the database
+    """
+    serializer = serializer_class(context=context)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(forbid_queries))
+        representations = [serializer.to_representation(instance) for instance in instances]
+    # `Hyperlink`s would pickle the names of their objects
+    return to_plain(representations) if plain else representations
+
+
+def get_worker_context(serializer, executor_type):
+    # the workers serialize with root serializers, which would apply the field selection of the request
+    selection = serializer.get_field_selection()
+    if executor_type != 'process':
+        return dict(serializer.context, **{FIELD_SELECTION_CONTEXT_KEY: selection})
+    context = {FIELD_SELECTION_CONTEXT_KEY: selection}
+    if serializer.context.get('request') is not None:
+        context['request'] = HalRequestStub(serializer.context['request'])
+    if 'format' in serializer.context:
+        context['format'] = serializer.context['format']
+    return context
+
+
+def serialize_parallel(serializer, instances, options):
+    """
+    Return the representations of `instances` by `serializer` (a list's child), serialized by the workers of
+    `options` (see `get_parallel_options`)
+    """
+    executor_type, workers, chunk_size = options
+    chunks = [instances[start:start + chunk_size] for start in range(0, len(instances), chunk_size)]
+    representations = [serializer.to_representation(instance) for instance in chunks[0]] if chunks else []
+    if len(chunks) < 2:
+        return representations
+
+    executor = get_executor(executor_type, workers)
+    context = get_worker_context(serializer, executor_type)
+    plain = executor_type == 'process'
+    futures = [executor.submit(serialize_chunk, type(serializer), context, chunk, plain) for chunk in chunks[1:]]
+    for chunk, future in zip(chunks[1:], futures):
+        try:
+            representations.extend(future.result())
+        except WorkerQueryError:
+            representations.extend(serializer.to_representation(instance) for instance in chunk)
+    return representations
@@ -1,9 +1,238 @@
+import codecs
+import json
+import re
+from itertools import islice
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
 from rest_framework.parsers import JSONParser
-from drf_hal_json import HAL_JSON_MEDIA_TYPE
+from rest_framework.utils.json import strict_constant
+from drf_hal_json import EMBEDDED_FIELD_NAME, HAL_JSON_MEDIA_TYPE
 
 from drf_hal_json.renderers import JsonHalRenderer
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+# tokens of which the end of the buffer may hold a beginning: literals, and the rest of a number
+PARTIAL_TOKENS = ('true', 'false', 'null', 'NaN', 'Infinity', '-Infinity', '.0', 'e+0', 'e-0', 'E+0', 'E-0')
+
 
 class JsonHalParser(JSONParser):
     media_type = HAL_JSON_MEDIA_TYPE
     renderer_class = JsonHalRenderer
+    json_backend = JsonHalRenderer.json_backend
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if self.json_backend is None:
+            return super(JsonHalParser, self).parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            content = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                content = content.decode(encoding)
+            return self.json_backend.loads(content)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class HalItemStream(object):
+    """
+    The items of a HAL collection document (a list in `_embedded.items`), decoded from the request body one at a
+    time while they are iterated, which can be done only once. `document` holds the other members of the
+    document; the members following the items are added when all items have been read.
+    """
+
+    def __init__(self, document, items):
+        self.document = document
+        self._items = items
+
+    def __iter__(self):
+        return self._items
+
+    def chunks(self, size):
+        """
+        Yield the items in lists of at most `size` items
+        """
+        while True:
+            chunk = list(islice(self._items, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class JsonStreamReader(object):
+    """
+    Decodes the JSON values of a byte stream one at a time, holding about `read_size` bytes of the stream
+    (or the size of the current value, if larger) in memory
+    """
+
+    def __init__(self, stream, encoding, decoder, read_size):
+        self.stream = stream
+        self.text_decoder = codecs.getincrementaldecoder(encoding)()
+        self.decoder = decoder
+        self.read_size = read_size
+        self.buffer = ''
+        self.pos = 0
+        # characters dropped from the buffer
+        self.offset = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """
+        Read `size` (default: `read_size`) more bytes into the buffer, returning False at the end of the stream
+        """
+        if self.eof:
+            return False
+        content = self.stream.read(size or self.read_size)
+        self.eof = not content
+        self.offset += self.pos
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(content, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or '' at the end of the stream
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expecting {} (char {})'.format(
+                ' or '.join(repr(c) for c in chars), self.offset + self.pos))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """
+        Decode the next value
+        """
+        self.peek()
+        size = self.read_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as exc:
+                if not self.truncated(exc) or not self.fill(size):
+                    raise ValueError('{} (char {})'.format(exc.msg, self.offset + exc.pos))
+            else:
+                # a number at the end of the buffer may go on
+                if not self.partial(end) or not self.fill(size):
+                    self.pos = end
+                    return value
+            # values spanning many reads are decoded again after reads of growing size
+            size *= 2
+
+    def truncated(self, exc):
+        """
+        Whether a decoding error is due to the end of the buffer, rather than to invalid data
+        """
+        if exc.msg.startswith('Unterminated string'):
+            return True
+        if exc.msg.startswith('Invalid \\uXXXX escape'):
+            return len(self.buffer) - exc.pos < 6
+        return self.partial(exc.pos)
+
+    def partial(self, pos):
+        """
+        Whether the buffer from `pos` on may be the beginning of a token cut off by the end of the buffer
+        """
+        rest = self.buffer[pos:]
+        return any(token.startswith(rest) for token in PARTIAL_TOKENS)
+
+    def members(self):
+        """
+        Yield the keys of the object whose '{' has been read, the value of each key is to be read before the next
+        """
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError('Expecting property name enclosed in double quotes (char {})'.format(
+                    self.offset + self.pos))
+            key = self.decode()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def elements(self):
+        """
+        Yield the values of the array whose '[' has been read
+        """
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.decode()
+            if self.expect(',]') == ']':
+                return
+
+    def end(self):
+        if self.peek():
+            raise ValueError('Extra data (char {})'.format(self.offset + self.pos))
+
+
+class JsonHalStreamingParser(JsonHalParser):
+    """
+    Parses HAL collection documents incrementally, for bulk uploads too large to be held in memory: the parsed
+    data is a `HalItemStream`, whose items are decoded from the request body while they are iterated (see
+    `HalStreamingCreateMixin`). The members preceding `_embedded.items` are decoded at once. Other documents
+    are parsed as a whole.
+    """
+    read_size = 64 * 1024
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        decoder = json.JSONDecoder(parse_constant=strict_constant if self.strict else None)
+        reader = JsonStreamReader(stream, encoding, decoder, self.read_size)
+        try:
+            return self.parse_document(reader)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+    def parse_document(self, reader):
+        if reader.peek() != '{':
+            value = reader.decode()
+            reader.end()
+            return value
+
+        reader.expect('{')
+        document = {}
+        members = reader.members()
+        for key in members:
+            if key != EMBEDDED_FIELD_NAME or reader.peek() != '{':
+                document[key] = reader.decode()
+                continue
+            embedded = document[key] = {}
+            reader.expect('{')
+            embedded_members = reader.members()
+            for embedded_key in embedded_members:
+                if embedded_key == 'items' and reader.peek() == '[':
+                    reader.expect('[')
+                    return HalItemStream(document, self.iter_items(reader, document, members, embedded_members))
+                embedded[embedded_key] = reader.decode()
+        reader.end()
+        return document
+
+    def iter_items(self, reader, document, members, embedded_members):
+        try:
+            for item in reader.elements():
+                yield item
+            embedded = document[EMBEDDED_FIELD_NAME]
+            for key in embedded_members:
+                embedded[key] = reader.decode()
+            for key in members:
+                document[key] = reader.decode()
+            reader.end()
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,174 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.relations import (HyperlinkedRelatedField, ManyRelatedField, PrimaryKeyRelatedField, RelatedField,
+                                      SlugRelatedField)
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from drf_hal_json.fields import LINK_PROPERTY_NAMES, HalLinkObjectMixin
+
+
+class HalQueryPlan(object):
+    """
+    The select_related/prefetch_related/only calls needed to serialize a queryset with a HAL serializer,
+    derived from its field tree (embedded serializers, related links, `source` paths and link properties).
+
+    `only` is None when a serializer reads attributes which can't be traced back to columns
+    (e.g. `SerializerMethodField`s), in which case no columns are deferred.
+    """
+
+    def __init__(self):
+        self.select_related = []
+        self.prefetch_related = []
+        self.only = []
+
+    def __repr__(self):
+        return '<HalQueryPlan select_related={!r} prefetch_related={!r} only={!r}>'.format(
+            self.select_related, self.prefetch_related, self.only)
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        plan = cls()
+        _SerializerWalker(plan).walk_serializer(serializer, serializer.Meta.model, (), prefetching=False)
+        return plan
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+    def add_select_related(self, path):
+        if path not in self.select_related:
+            self.select_related.append(path)
+
+    def add_prefetch_related(self, path):
+        if path not in self.prefetch_related:
+            self.prefetch_related.append(path)
+
+    def add_column(self, path, prefetching=False):
+        # columns of prefetched models are not restricted
+        if not prefetching and self.only is not None and path not in self.only:
+            self.only.append(path)
+
+
+class _SerializerWalker(object):
+    """
+    Walks the fields of a serializer and records the relations and columns they read in a `HalQueryPlan`.
+    Paths are tuples of lookup names relative to the model of the root serializer.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+
+    def walk_serializer(self, serializer, model, path, prefetching):
+        if isinstance(serializer, ListSerializer):
+            serializer = serializer.child
+        for field in serializer.fields.values():
+            if not field.write_only:
+                self.walk_field(field, model, path, prefetching)
+
+    def walk_field(self, field, model, path, prefetching):
+        if field.source != '*':
+            target = self.follow(model, path, field.source_attrs[:-1], prefetching)
+            if target is None:
+                return
+            model, path, prefetching = target
+            relation = self.get_relation(model, field.source_attrs[-1])
+            if relation is None:
+                self.add_column(model, path, field.source_attrs[-1], prefetching)
+                return
+            if isinstance(field, RelatedField) and field.use_pk_only_optimization() and self.is_forward(relation):
+                # only the foreign key column is read
+                self.plan.add_column('__'.join(path + (relation.name,)), prefetching)
+                return
+            model, path, prefetching = self.add_relation(relation, path, prefetching)
+
+        if isinstance(field, BaseSerializer):
+            self.walk_serializer(field, model, path, prefetching)
+        elif isinstance(field, ManyRelatedField):
+            self.walk_link(field.child_relation, model, path, prefetching)
+        elif isinstance(field, RelatedField):
+            self.walk_link(field, model, path, prefetching)
+        elif field.source == '*':
+            # e.g. a `SerializerMethodField`, which may read any attribute
+            self.unknown_columns(prefetching)
+
+    def walk_link(self, field, model, path, prefetching):
+        if isinstance(field, HyperlinkedRelatedField):
+            lookup_field = field.lookup_field
+        elif isinstance(field, SlugRelatedField):
+            lookup_field = field.slug_field
+        elif isinstance(field, PrimaryKeyRelatedField):
+            lookup_field = 'pk'
+        else:
+            self.unknown_columns(prefetching)
+            return
+        self.follow(model, path, lookup_field.split('__'), prefetching)
+        if isinstance(field, HalLinkObjectMixin):
+            for property_name in LINK_PROPERTY_NAMES:
+                property_path = getattr(field, property_name + '_field')
+                if property_path:
+                    self.follow(model, path, property_path.split('.'), prefetching)
+
+    def follow(self, model, path, attrs, prefetching):
+        """
+        Follow the attributes `attrs` from `model` (at `path`), recording all relations and columns on the way.
+        Returns the (model, path, prefetching) reached, or None if the attributes end in a column or property.
+        """
+        for attr in attrs:
+            relation = self.get_relation(model, attr)
+            if relation is None:
+                self.add_column(model, path, attr, prefetching)
+                return None
+            model, path, prefetching = self.add_relation(relation, path, prefetching)
+        return model, path, prefetching
+
+    def add_relation(self, relation, path, prefetching):
+        many = relation.many_to_many or relation.one_to_many
+        if self.is_forward(relation) or not many:
+            name = relation.name
+        else:
+            name = relation.get_accessor_name()
+        path = path + (name,)
+
+        if prefetching or many:
+            self.plan.add_prefetch_related('__'.join(path))
+            return relation.related_model, path, True
+        if self.is_forward(relation):
+            self.plan.add_column('__'.join(path), prefetching)
+        else:
+            # reverse one-to-one relations can be selected, but are not combined with `only`
+            self.unknown_columns(prefetching)
+        self.plan.add_select_related('__'.join(path))
+        return relation.related_model, path, False
+
+    def add_column(self, model, path, attr, prefetching):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            if attr != 'pk':
+                # a property or method of the model may read any column
+                self.unknown_columns(prefetching)
+            return
+        self.plan.add_column('__'.join(path + (model_field.name,)), prefetching)
+
+    def unknown_columns(self, prefetching):
+        if not prefetching:
+            self.plan.only = None
+
+    @staticmethod
+    def is_forward(relation):
+        return relation.concrete
+
+    @staticmethod
+    def get_relation(model, attr):
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            for related_object in model._meta.related_objects:
+                if related_object.get_accessor_name() == attr:
+                    return related_object
+            return None
+        return model_field if model_field.is_relation and model_field.related_model else None
@@ -1,7 +1,30 @@
 from rest_framework.renderers import JSONRenderer
 
-from drf_hal_json import HAL_JSON_MEDIA_TYPE
+from drf_hal_json import HAL_JSON_MEDIA_TYPE, JSON_BACKEND
+from drf_hal_json.instrumentation import instrument_rendering
+from drf_hal_json.json_backends import get_json_backend
 
 
 class JsonHalRenderer(JSONRenderer):
     media_type = HAL_JSON_MEDIA_TYPE
+    json_backend = get_json_backend(JSON_BACKEND)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # records the rendering in the metrics of the serialized data, if instrumented
+        return instrument_rendering(self, self.render_json, data, accepted_media_type, renderer_context)
+
+    def render_json(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.json_backend is None:
+            return super(JsonHalRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not self.json_backend.supports(self, indent):
+            return super(JsonHalRenderer, self).render(data, accepted_media_type, renderer_context)
+        try:
+            ret = self.json_backend.dumps(data, self, indent)
+        except (TypeError, ValueError, OverflowError):
+            # let the stdlib encoder render (or reject) what the backend can't encode
+            return super(JsonHalRenderer, self).render(data, accepted_media_type, renderer_context)
+
+        # like JSONRenderer, fully escape \u2028 and \u2029 to output JSON that is a strict javascript subset
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
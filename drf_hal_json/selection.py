@@ -0,0 +1,117 @@
+"""
+Sparse fieldsets and selective embedding with query parameters, enabled with the `FIELD_SELECTION` setting:
+
+    ?fields=name,related   only render these fields (the self link is always rendered)
+    ?embed=related         only embed these resources, other embedded resources are rendered as links
+    ?links=owner           only render these links
+
+The selection applies to the fields of the requested resource (or of the items of a collection), before any
+attribute is read. Embedded resources are demoted to links when their serializer has a hyperlinked self field,
+and are left out otherwise. The query parameters only apply to safe methods: writes validate and save all fields.
+"""
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import HyperlinkedIdentityField, ManyRelatedField
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from drf_hal_json import (EMBED_QUERY_PARAM, FIELD_SELECTION, FIELDS_QUERY_PARAM, LINKS_QUERY_PARAM,
+                          URL_FIELD_NAME)
+from drf_hal_json.fields import (HalContributeToLinkField, HalHyperlinkedRelatedField, HalIncludeInLinksMixin,
+                                 HalUrlTemplateMixin)
+
+# context key of the selection, which takes precedence over the query parameters of the request
+FIELD_SELECTION_CONTEXT_KEY = 'hal_field_selection'
+
+
+class HalFieldSelection(object):
+    """
+    The selected `fields`, `embed` and `links` names, each a frozenset or None if not restricted
+    """
+
+    def __init__(self, fields=None, embed=None, links=None):
+        self.fields = fields
+        self.embed = embed
+        self.links = links
+
+    def __repr__(self):
+        return '<HalFieldSelection fields={!r} embed={!r} links={!r}>'.format(self.fields, self.embed, self.links)
+
+    @property
+    def key(self):
+        return tuple(None if names is None else tuple(sorted(names))
+                     for names in (self.fields, self.embed, self.links))
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Return the selection of the query parameters of `request`, or None if nothing is selected or the method
+        of `request` is not safe
+        """
+        if not FIELD_SELECTION or request is None or request.method not in SAFE_METHODS:
+            return None
+        query_params = getattr(request, 'query_params', request.GET)
+        names = [cls.parse(query_params, param)
+                 for param in (FIELDS_QUERY_PARAM, EMBED_QUERY_PARAM, LINKS_QUERY_PARAM)]
+        if names == [None, None, None]:
+            return None
+        return cls(*names)
+
+    @staticmethod
+    def parse(query_params, param):
+        if param not in query_params:
+            return None
+        return frozenset(name.strip() for value in query_params.getlist(param) for name in value.split(',')
+                         if name.strip())
+
+    def apply(self, fields):
+        """
+        Return the selected `fields` of a serializer, with unselected embedded serializers demoted to links
+        """
+        selected = {}
+        for field_name, field in fields.items():
+            if isinstance(field, HalContributeToLinkField):
+                continue
+            if field_name != URL_FIELD_NAME:
+                if self.fields is not None and field_name not in self.fields:
+                    continue
+                if isinstance(field, BaseSerializer) and self.embed is not None and field_name not in self.embed:
+                    field = self.build_link_field(field_name, field)
+                    if field is None:
+                        continue
+                if self.is_link_field(field) and self.links is not None and field_name not in self.links:
+                    continue
+            selected[field_name] = field
+
+        # contributions to links are kept with their link
+        return type(fields)(
+            (field_name, selected.get(field_name, field)) for field_name, field in fields.items()
+            if field_name in selected or (isinstance(field, HalContributeToLinkField) and field.place_on in selected))
+
+    @staticmethod
+    def is_link_field(field):
+        if isinstance(field, ManyRelatedField):
+            field = field.child_relation
+        return isinstance(field, HalIncludeInLinksMixin)
+
+    @staticmethod
+    def build_link_field(field_name, serializer):
+        """
+        Return a link field to the resources embedded by `serializer`, or None if they have no self link
+        """
+        many = isinstance(serializer, ListSerializer)
+        child = serializer.child if many else serializer
+        url_field = child.fields.get(URL_FIELD_NAME)
+        if not isinstance(url_field, HyperlinkedIdentityField):
+            return None
+        kwargs = {
+            'view_name': url_field.view_name,
+            'lookup_field': url_field.lookup_field,
+            'lookup_url_kwarg': url_field.lookup_url_kwarg,
+            'format': url_field.format,
+            'read_only': True,
+            'many': many,
+        }
+        if isinstance(url_field, HalUrlTemplateMixin):
+            kwargs['url_templates'] = url_field.url_templates
+        if serializer.source and serializer.source != field_name:
+            kwargs['source'] = serializer.source
+        return HalHyperlinkedRelatedField(**kwargs)
@@ -1,36 +1,359 @@
-from collections import defaultdict
+import weakref
+from collections import OrderedDict, defaultdict
+from collections.abc import Mapping
 
-from drf_hal_json import EMBEDDED_FIELD_NAME, LINKS_FIELD_NAME, URL_FIELD_NAME
-from drf_hal_json.fields import HalContributeToLinkField, HalHyperlinkedIdentityField, HalIncludeInLinksMixin
-from rest_framework.fields import empty
-from rest_framework.relations import HyperlinkedRelatedField, ManyRelatedField
-from rest_framework.serializers import BaseSerializer, HyperlinkedModelSerializer, ListSerializer
+from django.apps import apps
+from django.db import connections, models, router, transaction
+from django.db.models.signals import post_save, pre_save
+from drf_hal_json import (CURIES, EMBEDDED_FIELD_NAME, EMBEDDED_IDENTITY_MAP, INSTRUMENTATION, LINKS_FIELD_NAME,
+                          URL_FIELD_NAME, compact_href)
+from drf_hal_json.caching import HalRepresentationCache, connect_signals, invalidate_model
+from drf_hal_json.compiled import compile_representation
+from drf_hal_json.fields import (HalContributeToLinkField, HalHrefResolutionMixin, HalHyperlinkedIdentityField,
+                                 HalIncludeInLinksMixin)
+from drf_hal_json.instrumentation import get_metrics, instrument
+from drf_hal_json.parallel import get_parallel_options, serialize_parallel
+from drf_hal_json.queries import HalQueryPlan, _SerializerWalker
+from drf_hal_json.selection import FIELD_SELECTION_CONTEXT_KEY, HalFieldSelection
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import SkipField, empty
+from rest_framework.relations import HyperlinkedRelatedField, ManyRelatedField, PKOnlyObject
+from rest_framework.request import clone_request
+from rest_framework.serializers import (BaseSerializer, HyperlinkedModelSerializer, ListSerializer,
+                                        SerializerMetaclass)
+from rest_framework.utils import model_meta
 from rest_framework.utils.field_mapping import get_nested_relation_kwargs
 from rest_framework.utils.serializer_helpers import ReturnDict
 
+# QuerySet.bulk_update is new in Django 2.2
+BULK_UPDATE = hasattr(models.QuerySet, 'bulk_update')
+
+
+class HalLayout(object):
+    """
+    Placement of the fields of a HAL serializer in the _links, _embedded and state sections.
+
+    Layouts only depend on the serializer class and its field names, so they are computed once
+    and shared by all instances (see `for_fields`).
+    """
+    _cache = weakref.WeakKeyDictionary()
+    max_layouts = 64
+
+    def __init__(self, fields, curie=None):
+        self.curie = curie
+        self.link_field_names = []
+        self.embedded_field_names = []
+        self.state_field_names = []
+        self.link_property_fields = defaultdict(dict)
+
+        for field_name, field in fields.items():
+            if HalModelSerializer._is_link_field(field):
+                self.link_field_names.append(field_name)
+
+        for field_name, field in fields.items():
+            if HalModelSerializer._is_link_contribution_field(field):
+                self.link_property_fields[field.place_on][field.property_name] = field_name
+                if field.place_on in self.link_field_names:
+                    continue
+                # contributions to fields that do not end up in _links are rendered as plain state
+            elif HalModelSerializer._is_embedded_field(field):
+                self.embedded_field_names.append(field_name)
+                continue
+            if field_name not in self.link_field_names:
+                self.state_field_names.append(field_name)
+
+    @classmethod
+    def for_fields(cls, serializer_class, fields):
+        layouts = cls._cache.setdefault(serializer_class, {})
+        # the types distinguish embedded resources from the links they may be demoted to (see `HalFieldSelection`)
+        key = tuple((field_name, type(getattr(field, 'child_relation', field)))
+                    for field_name, field in fields.items())
+        layout = layouts.get(key)
+        if layout is None:
+            if len(layouts) >= cls.max_layouts:
+                # field sets come from the field selection of query strings, like the query plans
+                layouts.clear()
+            curie = getattr(getattr(serializer_class, 'Meta', None), 'curie', None)
+            layout = layouts[key] = cls(fields, curie)
+        return layout
+
+    def get_rel(self, field_name):
+        """
+        Return the link relation of a link or embedded field, prefixed with the curie of the serializer
+        """
+        if self.curie and field_name != URL_FIELD_NAME:
+            return self.curie + ':' + field_name
+        return field_name
+
+    def bind(self, fields):
+        """
+        Resolve the field names of this layout to the readable field instances of one serializer,
+        naming the links and embedded fields by their rel
+        """
+        def readable(field_names):
+            return [(field_name, fields[field_name]) for field_name in field_names
+                    if not fields[field_name].write_only]
+
+        links = []
+        for field_name, field in readable(self.link_field_names):
+            properties = [
+                (property_name, fields[contribution_name])
+                for property_name, contribution_name in self.link_property_fields.get(field_name, {}).items()
+                if not fields[contribution_name].write_only
+            ]
+            links.append((self.get_rel(field_name), field, properties))
+        embedded = [(self.get_rel(field_name), field) for field_name, field in readable(self.embedded_field_names)]
+        return links, embedded, readable(self.state_field_names)
+
+
+def add_curies(links):
+    """
+    Add the `CURIES` setting to the links of a top-level HAL document
+    """
+    if CURIES:
+        links['curies'] = [dict(curie, templated=True) for curie in CURIES]
+    return links
+
+
+class HalDocument(ReturnDict):
+    """
+    A top-level HAL document, which is extended in place: the paginators add their links and properties to the
+    (cached) document of a `HalListSerializer` without copying it. The hrefs of added links are made relative to
+    the host of `request` if RELATIVE_HREFS is enabled.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.request = kwargs.pop('request', None)
+        kwargs.setdefault('serializer', None)
+        super(HalDocument, self).__init__(*args, **kwargs)
+
+    @classmethod
+    def for_request(cls, request, serializer=None):
+        """
+        Return a document linking the URL of `request` as self, with the curies
+        """
+        links = add_curies({URL_FIELD_NAME: {'href': compact_href(request, request.build_absolute_uri())}})
+        return cls([(LINKS_FIELD_NAME, links)], request=request, serializer=serializer)
+
+    def copy(self):
+        return HalDocument(self, request=self.request, serializer=self.serializer)
+
+    @property
+    def links(self):
+        return self.setdefault(LINKS_FIELD_NAME, {})
+
+    def add_link(self, rel, href, **properties):
+        """
+        Add a link to `href` with the link `properties` (e.g. templated=True)
+        """
+        link = self.links[rel] = {'href': compact_href(self.request, href)}
+        link.update(properties)
+        return link
+
 
 class HalListSerializer(ListSerializer):
 
+    def to_representation(self, data):
+        representation_cache = getattr(self.child, 'get_representation_cache', lambda: None)()
+        parallel_options = get_parallel_options(self.child)
+        if representation_cache is None and parallel_options is None:
+            return super(HalListSerializer, self).to_representation(data)
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        if representation_cache is not None:
+            # look up the cached representations of all items at once
+            return representation_cache.get_many(self.child, list(iterable))
+        return serialize_parallel(self.child, list(iterable), parallel_options)
+
+    def to_internal_value(self, data):
+        # a HAL collection document, as rendered by `data`
+        if isinstance(data, Mapping) and isinstance(data.get(EMBEDDED_FIELD_NAME), Mapping):
+            data = data[EMBEDDED_FIELD_NAME].get('items', data)
+        if isinstance(data, list) and isinstance(self.child, HalModelSerializer):
+            data = [self.child.lift_hal_data(item) for item in data]
+            self.prefetch_links(data)
+        return super(HalListSerializer, self).to_internal_value(data)
+
+    def prefetch_links(self, data):
+        """
+        Fetch the objects linked by the items in `data` with one query per relation (and one for the self links)
+        """
+        items = [item for item in data if isinstance(item, Mapping)]
+        for field_name, field in self.child.fields.items():
+            if field.read_only and field_name != URL_FIELD_NAME:
+                continue
+            many = isinstance(field, ManyRelatedField)
+            relation = field.child_relation if many else field
+            if not isinstance(relation, HalHrefResolutionMixin):
+                continue
+            hrefs = []
+            for item in items:
+                value = item.get(field_name)
+                if many and isinstance(value, list):
+                    hrefs.extend(value)
+                elif value is not None:
+                    hrefs.append(value)
+            if field_name == URL_FIELD_NAME:
+                queryset = self.child.get_self_link_queryset()
+                if queryset is not None:
+                    relation.prefetch_hrefs(hrefs, queryset)
+            elif hrefs:
+                relation.prefetch_hrefs(hrefs)
+
+    def create(self, validated_data):
+        """
+        Create the items without a self link, with `bulk_create` if possible, and update the items linking
+        to an existing object with `bulk_update`. Children overriding `create` or `update` and models which
+        can't be saved in bulk (see `can_bulk_save`) save their items one by one.
+        """
+        model = self.child.Meta.model
+        info = model_meta.get_field_info(model)
+        to_many = {field_name for field_name, relation in info.relations.items() if relation.to_many}
+        embedded = {field.source for field in self.child._writable_fields if isinstance(field, BaseSerializer)}
+        bulk_update = self.can_bulk_save(model) and not self.child_overrides('update')
+
+        with transaction.atomic():
+            instances = [attrs.pop(URL_FIELD_NAME, None) for attrs in validated_data]
+            updated = []
+            for instance, attrs in zip(instances, validated_data):
+                if instance is not None:
+                    if embedded.intersection(attrs) or not bulk_update:
+                        # embedded resources are saved by the serializer of the item
+                        self.child.update(instance, attrs)
+                    else:
+                        updated.append((instance, attrs))
+            if updated:
+                self.bulk_update(updated, to_many)
+            created = [attrs for instance, attrs in zip(instances, validated_data) if instance is None]
+            if created:
+                created_instances = iter(self.bulk_create(created, to_many | embedded))
+                instances = [next(created_instances) if instance is None else instance for instance in instances]
+        return instances
+
+    def bulk_create(self, validated_data, related):
+        """
+        Create the objects of `validated_data` with one `bulk_create`, or one by one with the serializer of the
+        items if the database doesn't return the primary keys or the `related` fields need to be saved
+        """
+        model = self.child.Meta.model
+        connection = connections[router.db_for_write(model)]
+        can_return_pks = getattr(connection.features, 'can_return_rows_from_bulk_insert', None)
+        if can_return_pks is None:
+            can_return_pks = connection.features.can_return_ids_from_bulk_insert
+        if (not can_return_pks or self.child_overrides('create') or not self.can_bulk_save(model)
+                or any(related.intersection(attrs) for attrs in validated_data)):
+            # the primary keys are needed for the related objects and the self links
+            return [self.child.create(attrs) for attrs in validated_data]
+        instances = model._default_manager.bulk_create([model(**attrs) for attrs in validated_data])
+        # bulk operations send no post_save signals
+        invalidate_model(model)
+        return instances
+
+    def bulk_update(self, updates, to_many):
+        model = self.child.Meta.model
+        field_names = set()
+        for instance, attrs in updates:
+            for attr, value in attrs.items():
+                if attr not in to_many:
+                    setattr(instance, attr, value)
+                    field_names.add(attr)
+        if field_names and BULK_UPDATE:
+            model._default_manager.bulk_update([instance for instance, attrs in updates], sorted(field_names))
+            invalidate_model(model)
+        elif field_names:
+            for instance, attrs in updates:
+                instance.save(update_fields=sorted(field_names))
+        for instance, attrs in updates:
+            for attr in to_many.intersection(attrs):
+                getattr(instance, attr).set(attrs[attr])
+
+    @staticmethod
+    def can_bulk_save(model):
+        """
+        Whether the objects of `model` can be saved with bulk operations, which neither call `save` nor send
+        `pre_save`/`post_save` signals, and don't support multi-table inheritance
+        """
+        return (model.save is models.Model.save and not model._meta.parents
+                and not pre_save.has_listeners(model) and not post_save.has_listeners(model))
+
+    def child_overrides(self, method_name):
+        """
+        Whether the class of the child overrides the `create` or `update` method of `HalModelSerializer`
+        """
+        return getattr(type(self.child), method_name) is not getattr(HalModelSerializer, method_name)
+
     @property
     def data(self):
-        # The parent class returns ReturnList
-        return ReturnDict(
-            {
-                LINKS_FIELD_NAME: {
-                    URL_FIELD_NAME: {
-                        'href': self.context['request'].build_absolute_uri()
-                    }
-                },
-                EMBEDDED_FIELD_NAME: {
-                    # `items` mirrors hardcoded value in pagination classes
-                    'items': super(ListSerializer, self).data
-                }
-            },
-            serializer=self
-        )
-
-
-class HalModelSerializer(HyperlinkedModelSerializer):
+        # The parent class returns ReturnList. The document is built once, the paginators extend it in place.
+        try:
+            return self._hal_document
+        except AttributeError:
+            pass
+        with instrument(self):
+            items = super(ListSerializer, self).data
+        document = self._hal_document = HalDocument.for_request(self.context['request'], serializer=self)
+        # `items` mirrors hardcoded value in pagination classes
+        document[EMBEDDED_FIELD_NAME] = dict(self.hoist_embedded(items), items=items)
+        return document
+
+    def hoist_embedded(self, items):
+        """
+        Move the resources embedded by the `items` to the returned dict, by rel, leaving their links in the items.
+        Enabled with the `hoist_embedded` Meta option of the child: True, or the names of the fields to hoist.
+        Each resource is hoisted once; resources without a self link stay embedded.
+        """
+        field_names = getattr(getattr(self.child, 'Meta', None), 'hoist_embedded', False)
+        if not field_names:
+            return {}
+        layout = self.child.layout
+        if field_names is True:
+            field_names = layout.embedded_field_names
+        rels = {layout.get_rel(field_name) for field_name in field_names} - {'items'}
+
+        hoisted = OrderedDict()
+        for item in items:
+            embedded = item.get(EMBEDDED_FIELD_NAME)
+            if not embedded:
+                continue
+            for rel in [rel for rel in embedded if rel in rels]:
+                resources = embedded[rel] if isinstance(embedded[rel], list) else [embedded[rel]]
+                hrefs = [self.get_href(self.child._get_url(resource)) for resource in resources]
+                if not all(hrefs):
+                    continue
+                hoisted_resources = hoisted.setdefault(rel, OrderedDict())
+                for href, resource in zip(hrefs, resources):
+                    hoisted_resources.setdefault(href, resource)
+                del embedded[rel]
+            if not embedded:
+                del item[EMBEDDED_FIELD_NAME]
+        return OrderedDict((rel, list(resources.values())) for rel, resources in hoisted.items())
+
+    @staticmethod
+    def get_href(link):
+        return link.get('href') if isinstance(link, Mapping) else link
+
+
+class _IdentityMapHit(object):
+    """
+    The attribute of an embedded resource which is represented by the identity map
+    """
+
+    def __init__(self, representation):
+        self.representation = representation
+
+
+class HalSerializerMetaclass(SerializerMetaclass):
+    """
+    Connects the invalidation of the representation cache of the serializer classes which enable it when they
+    are created, once the models are loaded (the app config connects the classes created before)
+    """
+
+    def __init__(cls, name, bases, attrs):
+        super(HalSerializerMetaclass, cls).__init__(name, bases, attrs)
+        if apps.models_ready:
+            connect_signals(cls)
+
+
+class HalModelSerializer(HyperlinkedModelSerializer, metaclass=HalSerializerMetaclass):
     """
     Serializer for HAL representation of django models
     """
@@ -38,11 +361,228 @@ class HalModelSerializer(HyperlinkedModelSerializer):
     serializer_url_field = HalHyperlinkedIdentityField
     default_list_serializer = HalListSerializer
 
+    # generated nested serializers, by parent serializer class and (related model, depth)
+    _nested_serializer_classes = weakref.WeakKeyDictionary()
+    _nested_serializer_registry = {}
+    _query_plans = weakref.WeakKeyDictionary()
+    _representation_caches = weakref.WeakKeyDictionary()
+    max_query_plans = 64
+
     def __init__(self, instance=None, data=empty, **kwargs):
         super(HalModelSerializer, self).__init__(instance, data, **kwargs)
         self.nested_serializer_class = self.__class__
-        if data != empty and not LINKS_FIELD_NAME in data:
-            data[LINKS_FIELD_NAME] = dict()  # put links in data, so that field validation does not fail
+
+    @classmethod
+    def get_query_plan(cls, selection=None):
+        """
+        Return the `HalQueryPlan` (select_related/prefetch_related/only) for querysets serialized by this class,
+        optionally with the fields of a `HalFieldSelection`
+        """
+        plans = HalModelSerializer._query_plans.setdefault(cls, {})
+        key = selection.key if selection is not None else None
+        plan = plans.get(key)
+        if plan is None:
+            if len(plans) >= cls.max_query_plans:
+                # selections come from query strings, don't keep an unbounded number of them
+                plans.clear()
+            serializer = cls(context={FIELD_SELECTION_CONTEXT_KEY: selection})
+            plan = plans[key] = HalQueryPlan.for_serializer(serializer)
+        return plan
+
+    def lift_hal_data(self, data):
+        """
+        Return `data` with the hrefs of its `_links` as the values of the link fields and the resources of its
+        `_embedded` as the values of the embedded fields, i.e. how DRF expects them.
+        Values present outside of `_links` and `_embedded` take precedence. The input is not modified.
+        """
+        if not isinstance(data, Mapping):
+            return data
+        links = data.get(LINKS_FIELD_NAME)
+        embedded = data.get(EMBEDDED_FIELD_NAME)
+        if not isinstance(links, Mapping) and not isinstance(embedded, Mapping):
+            return data
+
+        fields = self.fields
+        lifted = dict(data)
+        if isinstance(links, Mapping):
+            field_names = {self.layout.get_rel(field_name): field_name for field_name in self.layout.link_field_names}
+            for rel, link in links.items():
+                field_name = field_names.get(rel, rel)
+                # the links of embedded resources are copies of their self links
+                if field_name not in fields or field_name in lifted or self._is_embedded_field(fields[field_name]):
+                    continue
+                if isinstance(link, list):
+                    lifted[field_name] = [item.get('href') if isinstance(item, Mapping) else item for item in link]
+                else:
+                    lifted[field_name] = link.get('href') if isinstance(link, Mapping) else link
+        if isinstance(embedded, Mapping):
+            field_names = {self.layout.get_rel(field_name): field_name
+                           for field_name in self.layout.embedded_field_names}
+            for rel, resource in embedded.items():
+                field_name = field_names.get(rel)
+                if field_name is not None and field_name not in lifted:
+                    lifted[field_name] = resource
+        return lifted
+
+    def to_internal_value(self, data):
+        data = self.lift_hal_data(data)
+        ret = super(HalModelSerializer, self).to_internal_value(data)
+        # the self links of items of collections and of embedded resources select the objects to update, the
+        # self link of a single resource is read-only like in its representation
+        if self.parent is not None and isinstance(data, Mapping) and data.get(URL_FIELD_NAME) is not None:
+            ret[URL_FIELD_NAME] = self.get_self_instance(data[URL_FIELD_NAME])
+        return ret
+
+    def get_self_instance(self, href):
+        """
+        Return the object of the self link `href` in incoming data, from the objects of `get_self_link_queryset`
+        which the request has the object permissions of the view for
+        """
+        queryset = self.get_self_link_queryset()
+        if queryset is None:
+            raise ValidationError({URL_FIELD_NAME: ['Linked resources can not be updated here.']})
+        url_field = self.fields.get(URL_FIELD_NAME)
+        if isinstance(url_field, HalHrefResolutionMixin):
+            prefetched = url_field.prefetch_hrefs([href], queryset)
+            if href in prefetched:
+                instance = prefetched[href]
+                view = self.context.get('view')
+                if view is not None and hasattr(view, 'check_object_permissions'):
+                    # the object is changed, whatever the method of the request (e.g. POST, which the model
+                    # permissions only require the `add` permission for)
+                    request = clone_request(self.context['request'], 'PATCH')
+                    view.check_permissions(request)
+                    view.check_object_permissions(request, instance)
+                return instance
+        raise ValidationError({URL_FIELD_NAME: [HyperlinkedRelatedField.default_error_messages['does_not_exist']]})
+
+    def get_self_link_queryset(self):
+        """
+        Return the objects which incoming data may update by their self link, or None if self links are rejected:
+        the (filtered) queryset of the view for the resources of a view which enables `update_by_self_link`,
+        otherwise the queryset of the `self_link_queryset` Meta option
+        """
+        view = self.context.get('view')
+        root = self.parent if isinstance(self.parent, ListSerializer) else self
+        if root.parent is None and view is not None and hasattr(view, 'get_queryset'):
+            queryset = view.filter_queryset(view.get_queryset())
+            if queryset.model is self.Meta.model:
+                return queryset if getattr(view, 'update_by_self_link', False) else None
+        queryset = getattr(self.Meta, 'self_link_queryset', None)
+        return queryset.all() if queryset is not None else None
+
+    def create(self, validated_data):
+        validated_data.pop(URL_FIELD_NAME, None)
+        embedded = self.pop_embedded(validated_data)
+        if not embedded:
+            return super(HalModelSerializer, self).create(validated_data)
+        with transaction.atomic():
+            self.save_embedded(embedded, validated_data)
+            instance = super(HalModelSerializer, self).create(validated_data)
+            self.save_embedded_relations(embedded, instance)
+        return instance
+
+    def update(self, instance, validated_data):
+        validated_data.pop(URL_FIELD_NAME, None)
+        embedded = self.pop_embedded(validated_data)
+        if not embedded:
+            return super(HalModelSerializer, self).update(instance, validated_data)
+        with transaction.atomic():
+            self.save_embedded(embedded, validated_data)
+            instance = super(HalModelSerializer, self).update(instance, validated_data)
+            self.save_embedded_relations(embedded, instance)
+        return instance
+
+    def pop_embedded(self, validated_data):
+        """
+        Remove the values of writable embedded resources from `validated_data`,
+        returning the (field, model relation, value) of each. Values which are already objects (e.g. set by
+        the serializer of the parent resource) are kept.
+        """
+        embedded = []
+        for field in self._writable_fields:
+            if (isinstance(field, BaseSerializer) and len(field.source_attrs) == 1
+                    and isinstance(validated_data.get(field.source), (list, dict))):
+                relation = _SerializerWalker.get_relation(self.Meta.model, field.source)
+                if relation is not None:
+                    embedded.append((field, relation, validated_data.pop(field.source)))
+        return embedded
+
+    def save_embedded(self, embedded, validated_data):
+        """
+        Save the embedded resources of forward foreign keys and one-to-one relations, before the instance
+        """
+        forward = [(field, value) for field, relation, value in embedded
+                   if relation.concrete and not relation.many_to_many]
+        saved = iter(self.save_grouped([(field, [value]) for field, value in forward if value is not None]))
+        for field, value in forward:
+            validated_data[field.source] = next(saved)[0] if value is not None else None
+
+    def save_embedded_relations(self, embedded, instance):
+        """
+        Save the embedded resources of reverse and many-to-many relations, after the instance. Self-linked
+        resources of reverse relations must already belong to the instance.
+        """
+        relations = []
+        entries = []
+        for field, relation, value in embedded:
+            if relation.concrete and not relation.many_to_many:
+                continue
+            items = value if isinstance(field, ListSerializer) else [value] if value is not None else []
+            if not relation.many_to_many:
+                # reverse foreign keys and one-to-one relations point to the instance
+                target_attname = relation.field.target_field.attname
+                for attrs in items:
+                    linked = attrs.get(URL_FIELD_NAME)
+                    if (linked is not None and
+                            getattr(linked, relation.field.attname) != getattr(instance, target_attname)):
+                        raise ValidationError({field.field_name: ['Linked resources of other objects can not be '
+                                                                  'moved here.']})
+                    attrs[relation.field.name] = instance
+            relations.append((field, relation))
+            entries.append((field, items))
+        for (field, relation), saved in zip(relations, self.save_grouped(entries)):
+            if relation.many_to_many:
+                # members left out of the document are kept
+                getattr(instance, field.source).add(*saved)
+
+    def save_grouped(self, entries):
+        """
+        Save the validated items of the embedded fields of `entries`, (field, items) pairs, grouped by serializer
+        class, so that each group is saved with the bulk operations of its list serializer.
+        Returns the saved instances of each entry.
+        """
+        groups = OrderedDict()
+        for index, (field, items) in enumerate(entries):
+            child = field.child if isinstance(field, ListSerializer) else field
+            groups.setdefault(child.__class__, []).append((index, items))
+        saved = [None] * len(entries)
+        for serializer_class, group in groups.items():
+            list_serializer = serializer_class(many=True, context=self.context)
+            instances = iter(list_serializer.create([attrs for index, items in group for attrs in items]))
+            for index, items in group:
+                saved[index] = [next(instances) for attrs in items]
+        return saved
+
+    @property
+    def data(self):
+        with instrument(self):
+            data = super(HalModelSerializer, self).data
+        if CURIES and self.parent is None and LINKS_FIELD_NAME in data:
+            add_curies(data[LINKS_FIELD_NAME])
+        return data
+
+    @classmethod
+    def get_representation_cache(cls):
+        """
+        Return the `HalRepresentationCache` of this class if enabled with the `cache_representation` Meta option
+        """
+        if not getattr(getattr(cls, 'Meta', None), 'cache_representation', False):
+            return None
+        representation_cache = HalModelSerializer._representation_caches.get(cls)
+        if representation_cache is None:
+            representation_cache = HalModelSerializer._representation_caches[cls] = HalRepresentationCache(cls)
+        return representation_cache
 
     @classmethod
     def many_init(cls, *args, **kwargs):
@@ -71,47 +611,213 @@ class HalModelSerializer(HyperlinkedModelSerializer):
         except AttributeError:
             return None
 
+    @staticmethod
+    def _serialize_field(field, instance):
+        """
+        Serialize a single field the way `Serializer.to_representation` does, returning `empty` for skipped fields
+        """
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return empty
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        if check_for_none is None:
+            return None
+        return field.to_representation(attribute)
+
+    @property
+    def bound_layout(self):
+        try:
+            return self._bound_layout
+        except AttributeError:
+            fields = self.fields
+            self._bound_layout = self.layout.bind(fields)
+            return self._bound_layout
+
+    def get_identity_map(self):
+        """
+        Return the representations of the embedded resources of the serialization pass, by serializer class and pk
+        (see the `EMBEDDED_IDENTITY_MAP` setting), or None for the resources of the top-level document
+        """
+        if not EMBEDDED_IDENTITY_MAP:
+            return None
+        parent = self.parent.parent if isinstance(self.parent, ListSerializer) else self.parent
+        if parent is None:
+            return None
+        root = self.root
+        try:
+            return root._hal_identity_map
+        except AttributeError:
+            root._hal_identity_map = {}
+            return root._hal_identity_map
+
+    @staticmethod
+    def reset_identity_map(serializer):
+        """
+        Forget the embedded representations shared by the resources `serializer` (a root) represented so far,
+        e.g. between the chunks of a streamed collection
+        """
+        serializer.__dict__.pop('_hal_identity_map', None)
+
+    @property
+    def identity_attname(self):
+        """
+        The foreign key column which holds the pk of the embedded resource, if this serializer embeds the object
+        of a forward relation to a primary key
+        """
+        try:
+            return self._identity_attname
+        except AttributeError:
+            self._identity_attname = None
+            parent_model = getattr(getattr(self.parent, 'Meta', None), 'model', None)
+            if parent_model is not None and len(self.source_attrs) == 1:
+                relation = _SerializerWalker.get_relation(parent_model, self.source_attrs[0])
+                if (relation is not None and relation.concrete and not relation.many_to_many
+                        and relation.target_field.primary_key):
+                    self._identity_attname = relation.attname
+            return self._identity_attname
+
+    def get_attribute(self, instance):
+        identity_map = self.get_identity_map()
+        if identity_map is not None and self.identity_attname is not None:
+            # an embedded resource which has already been represented is not fetched again
+            representation = identity_map.get((self.__class__, getattr(instance, self.identity_attname)))
+            if representation is not None:
+                return _IdentityMapHit(representation)
+        return super(HalModelSerializer, self).get_attribute(instance)
+
     def to_representation(self, instance):
-        ret = super(HalModelSerializer, self).to_representation(instance)
-        resp = defaultdict(dict)
-
-        for field_name in self.link_field_names:
-            val = ret.pop(field_name)
-            if val is not None:
-                resp[LINKS_FIELD_NAME][field_name] = self.build_link_object(val)
-                for property_name in self.link_property_fields.get(field_name, []):
-                    prop = ret.pop(self.link_property_fields[field_name][property_name])
-                    if prop is not None:
-                        resp[LINKS_FIELD_NAME][field_name][property_name] = prop
-
-        for field_name in self.embedded_field_names:
+        if isinstance(instance, _IdentityMapHit):
+            return instance.representation
+        identity_map = self.get_identity_map()
+        pk = getattr(instance, 'pk', None)
+        if identity_map is None or pk is None:
+            return self.represent(instance)
+        key = (self.__class__, pk)
+        representation = identity_map.get(key)
+        if representation is None:
+            representation = identity_map[key] = self.represent(instance)
+        return representation
+
+    def represent(self, instance):
+        representation_cache = self.get_representation_cache()
+        if representation_cache is not None:
+            return representation_cache.get(self, instance)
+        return self.build_representation(instance)
+
+    @property
+    def compiled_representation(self):
+        """
+        The function compiled from the fields if enabled with the `compile_representation` Meta option (of this
+        serializer or the one embedding it), else None
+        """
+        try:
+            return self._compiled_representation
+        except AttributeError:
+            compiled = None
+            enabled = getattr(getattr(self, 'Meta', None), 'compile_representation', None)
+            if enabled is None:
+                parent = self.parent.parent if isinstance(self.parent, ListSerializer) else self.parent
+                enabled = getattr(parent, 'compiled_representation', None) is not None
+            if enabled:
+                # instrumented passes time the fields one by one
+                if not (INSTRUMENTATION and get_metrics(self) is not None):
+                    compiled = compile_representation(self)
+            self._compiled_representation = compiled
+            return compiled
+
+    def build_representation(self, instance):
+        compiled_representation = self.compiled_representation
+        if compiled_representation is not None:
+            return compiled_representation(instance)
+        return self._build_representation(instance)
+
+    def _build_representation(self, instance, serialize_state=None):
+        """
+        Build the representation of `instance`: its links, embedded resources and state. The state fields are
+        serialized by `serialize_state(instance, ret, serialize_field)` if given (see `compile_representation`).
+        """
+        serialize_field = self._serialize_field
+        if INSTRUMENTATION:
+            metrics = get_metrics(self)
+            if metrics is not None:
+                serialize_field = metrics.wrap_serialize_field(self, serialize_field)
+        link_fields, embedded_fields, state_fields = self.bound_layout
+        links = {}
+        embedded = {}
+        ret = {LINKS_FIELD_NAME: links, EMBEDDED_FIELD_NAME: embedded}
+        unplaced_properties = []
+
+        for field_name, field, properties in link_fields:
+            val = serialize_field(field, instance)
+            if val is empty:
+                continue
+            if val is None:
+                unplaced_properties.extend(properties)
+                continue
+            link = links[field_name] = self.build_link_object(val)
+            for property_name, property_field in properties:
+                prop = serialize_field(property_field, instance)
+                if prop is not None and prop is not empty:
+                    link[property_name] = prop
+
+        for field_name, field in embedded_fields:
             # if a related resource is embedded, it should still
             # get a link in the parent object
-            if type(ret[field_name]) == list:
-                embed_self = list(filter(lambda x: x is not None, [self._get_url(x) for x in ret[field_name] if x]))
+            val = serialize_field(field, instance)
+            if val is empty:
+                continue
+            if isinstance(val, list):
+                embed_self = [url for url in (self._get_url(x) for x in val if x) if url is not None]
             else:
-                embed_self = self._get_url(ret[field_name])
+                embed_self = self._get_url(val)
             if embed_self:
-                resp[LINKS_FIELD_NAME][field_name] = embed_self
-            resp[EMBEDDED_FIELD_NAME][field_name] = ret.pop(field_name)
+                links[field_name] = embed_self
+            embedded[field_name] = val
 
-        resp = dict(resp, **ret)
-        return resp
+        if not links:
+            del ret[LINKS_FIELD_NAME]
+        if not embedded:
+            del ret[EMBEDDED_FIELD_NAME]
+
+        if serialize_state is not None:
+            serialize_state(instance, ret, serialize_field)
+        else:
+            for field_name, field in state_fields:
+                val = serialize_field(field, instance)
+                if val is not empty:
+                    ret[field_name] = val
+        # contributions to links which are not present are kept as plain state
+        for property_name, field in unplaced_properties:
+            val = serialize_field(field, instance)
+            if val is not empty:
+                ret[field.field_name] = val
+        return ret
+
+    def get_field_selection(self):
+        """
+        Return the `HalFieldSelection` for the fields of this serializer: of the request (or context) for
+        the root serializer and the items of a root list serializer, None for embedded serializers
+        """
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None
+        if FIELD_SELECTION_CONTEXT_KEY in self.context:
+            return self.context[FIELD_SELECTION_CONTEXT_KEY]
+        return HalFieldSelection.from_request(self.context.get('request'))
 
     def get_fields(self):
         fields = super(HalModelSerializer, self).get_fields()
+        selection = self.get_field_selection()
+        if selection is not None:
+            fields = selection.apply(fields)
 
-        self.embedded_field_names = []
-        self.link_field_names = []
-        self.link_property_fields = defaultdict(dict)
-
-        for field_name, field in fields.items():
-            if self._is_link_field(field):
-                self.link_field_names.append(field_name)
-            if self._is_link_contribution_field(field):
-                self.link_property_fields[field.place_on][field.property_name] = field_name
-            elif self._is_embedded_field(field):
-                self.embedded_field_names.append(field_name)
+        self.layout = HalLayout.for_fields(self.__class__, fields)
+        self.embedded_field_names = self.layout.embedded_field_names
+        self.link_field_names = self.layout.link_field_names
+        self.link_property_fields = self.layout.link_property_fields
         return fields
 
     @staticmethod
@@ -129,17 +835,42 @@ class HalModelSerializer(HyperlinkedModelSerializer):
     def _is_embedded_field(field):
         return isinstance(field, BaseSerializer)
 
+    @classmethod
+    def register_nested_serializer(cls, model, serializer_class):
+        """
+        Embed `model` with `serializer_class` instead of a generated serializer when nesting with `depth`.
+        Registrations apply to this serializer class, its subclasses and the serializers nested by them.
+        """
+        if '_nested_serializer_registry' not in cls.__dict__:
+            cls._nested_serializer_registry = dict(getattr(cls, '_nested_serializer_registry', {}))
+        cls._nested_serializer_registry[model] = serializer_class
+        HalModelSerializer._nested_serializer_classes.clear()
+
+    def get_nested_serializer_class(self, relation_info, nested_depth):
+        registry = getattr(self, '_nested_serializer_registry', {})
+        model = relation_info.related_model
+        if model in registry:
+            return registry[model]
+
+        nested_classes = HalModelSerializer._nested_serializer_classes.setdefault(self.__class__, {})
+        key = (model, nested_depth)
+        if key not in nested_classes:
+            class NestedSerializer(HalModelSerializer):
+                _nested_serializer_registry = registry
+
+                class Meta:
+                    model = relation_info.related_model
+                    depth = nested_depth - 1
+                    fields = '__all__'
+
+            nested_classes[key] = NestedSerializer
+        return nested_classes[key]
+
     def build_nested_field(self, field_name, relation_info, nested_depth):
         """
         Create nested fields for forward and reverse relationships.
         """
-        class NestedSerializer(HalModelSerializer):
-            class Meta:
-                model = relation_info.related_model
-                depth = nested_depth - 1
-                fields = '__all__'
-
-        field_class = NestedSerializer
+        field_class = self.get_nested_serializer_class(relation_info, nested_depth)
         field_kwargs = get_nested_relation_kwargs(relation_info)
 
         return field_class, field_kwargs
@@ -1,9 +1,50 @@
+import calendar
+import hashlib
+from collections.abc import Mapping
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Count, Max, QuerySet, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import CreateModelMixin
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from drf_hal_json import LINKS_FIELD_NAME
+from drf_hal_json import EMBEDDED_FIELD_NAME, LINKS_FIELD_NAME, URL_FIELD_NAME
+from drf_hal_json.parsers import HalItemStream
+from drf_hal_json.renderers import JsonHalRenderer
+from drf_hal_json.selection import HalFieldSelection
+from drf_hal_json.serializers import HalDocument, HalModelSerializer
 
 
 class HalCreateModelMixin(CreateModelMixin):
+    """
+    Creates a single resource, or many resources from a HAL collection document (a list in `_embedded.items`).
+    With `update_by_self_link`, items of a collection which have a self link update the linked object instead,
+    if the request has the permissions of the view for updating it; otherwise self links are rejected.
+    """
+    update_by_self_link = False
+
+    def create(self, request, *args, **kwargs):
+        if not self.is_collection(request.data):
+            return super(HalCreateModelMixin, self).create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        self.perform_bulk_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_bulk_create(self, serializer):
+        serializer.save()
+
+    @staticmethod
+    def is_collection(data):
+        embedded = data.get(EMBEDDED_FIELD_NAME) if isinstance(data, Mapping) else None
+        return isinstance(embedded, Mapping) and isinstance(embedded.get('items'), list)
+
     def get_success_headers(self, data):
         links_data = data.get(LINKS_FIELD_NAME)
         if not links_data:
@@ -12,3 +53,191 @@ class HalCreateModelMixin(CreateModelMixin):
         if not url_field_data:
             return {}
         return {'Location': url_field_data}
+
+
+class HalStreamingCreateMixin(HalCreateModelMixin):
+    """
+    Creates the items of HAL collection documents parsed by `JsonHalStreamingParser` chunk by chunk, so that only
+    `ingest_chunk_size` items of the request body are held in memory. Each chunk is validated and saved like the
+    collections of `HalCreateModelMixin`, all chunks in one transaction. The response links the saved resources
+    in `_links.items` instead of representing them.
+    """
+    ingest_chunk_size = 500
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, HalItemStream):
+            return super(HalStreamingCreateMixin, self).create(request, *args, **kwargs)
+        links = []
+        offset = 0
+        with transaction.atomic():
+            for chunk in request.data.chunks(self.ingest_chunk_size):
+                serializer = self.get_serializer(data=chunk, many=True)
+                self.validate_chunk(serializer, offset)
+                self.perform_bulk_create(serializer)
+                links.extend(self.get_item_links(serializer))
+                offset += len(chunk)
+        document = HalDocument.for_request(request)
+        document.links['items'] = links
+        return Response(document, status=status.HTTP_201_CREATED)
+
+    def validate_chunk(self, serializer, offset):
+        """
+        Validate a chunk of items, the errors of the items are reported by their index in the document
+        """
+        if serializer.is_valid():
+            return
+        errors = serializer.errors
+        if isinstance(errors, list):
+            errors = {'items': {offset + index: item_errors for index, item_errors in enumerate(errors)
+                                if item_errors}}
+        raise ValidationError(errors)
+
+    def get_item_links(self, serializer):
+        """
+        Return the self links of the objects saved by `serializer`
+        """
+        url_field = serializer.child.fields.get(URL_FIELD_NAME)
+        if url_field is None:
+            return []
+        return [serializer.child.build_link_object(url_field.to_representation(url_field.get_attribute(instance)))
+                for instance in serializer.instance]
+
+
+class HalQueryPlanMixin(object):
+    """
+    Applies the query plan of a `HalModelSerializer` (see `HalModelSerializer.get_query_plan`) to the queryset
+    of the view, so related resources are selected or prefetched instead of being queried per object.
+    """
+
+    def get_queryset(self):
+        queryset = super(HalQueryPlanMixin, self).get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'get_query_plan'):
+            selection = HalFieldSelection.from_request(self.request)
+            queryset = serializer_class.get_query_plan(selection).apply(queryset)
+        return queryset
+
+
+class HalStreamingListMixin(object):
+    """
+    Streams unpaginated HAL collections rendered by `JsonHalRenderer`: the queryset is iterated in chunks of
+    `stream_chunk_size` objects (prefetching related objects per chunk) and the `_embedded.items` are
+    serialized and rendered chunk by chunk, so neither all objects nor the whole document are held in memory.
+    """
+    stream_chunk_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        if self.paginator is not None or not isinstance(request.accepted_renderer, JsonHalRenderer):
+            return super(HalStreamingListMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer = self.get_serializer(queryset, many=True)
+        return StreamingHttpResponse(
+            self.stream_list(serializer, queryset, request.accepted_renderer, request.accepted_media_type),
+            content_type=request.accepted_media_type)
+
+    def stream_list(self, serializer, queryset, renderer, accepted_media_type):
+        def render(data):
+            return renderer.render(data, accepted_media_type)
+
+        links = HalDocument.for_request(self.request).links
+        yield b''.join([
+            b'{', render(LINKS_FIELD_NAME), b':', render(links), b',',
+            render(EMBEDDED_FIELD_NAME), b':{', render('items'), b':['])
+
+        separator = b''
+        for chunk in self.iterate_chunks(queryset):
+            # embedded resources are only shared within a chunk, to keep the memory bounded
+            HalModelSerializer.reset_identity_map(serializer)
+            items = render([serializer.child.to_representation(instance) for instance in chunk])
+            # strip the brackets of the rendered list to append its items to the stream
+            yield separator + items[1:-1]
+            separator = b','
+        yield b']}}'
+
+    def iterate_chunks(self, queryset):
+        prefetch_lookups = ()
+        if isinstance(queryset, QuerySet):
+            prefetch_lookups = queryset._prefetch_related_lookups
+            queryset = queryset.prefetch_related(None).iterator(chunk_size=self.stream_chunk_size)
+        iterator = iter(queryset)
+        while True:
+            chunk = list(islice(iterator, self.stream_chunk_size))
+            if not chunk:
+                return
+            if prefetch_lookups:
+                prefetch_related_objects(chunk, *prefetch_lookups)
+            yield chunk
+
+
+class HalConditionalMixin(object):
+    """
+    Base of the conditional retrieve and list mixins. The validators (ETag and Last-Modified) are aggregated from
+    the `etag_fields` and `last_modified_field` columns in the database, so requests with a matching
+    If-None-Match or If-Modified-Since header are answered with 304 Not Modified before anything is serialized.
+
+    The fields may be paths of related models (e.g. 'related__updated') to cover changes of embedded resources.
+    At least one of them must be set, the views raise `ImproperlyConfigured` otherwise.
+    """
+    last_modified_field = None
+    etag_fields = ()
+
+    def get_etag_fields(self):
+        if not self.etag_fields and not self.last_modified_field:
+            # the validators would not change when the objects do
+            raise ImproperlyConfigured('{} needs etag_fields or a last_modified_field'.format(type(self).__name__))
+        fields = list(self.etag_fields)
+        if self.last_modified_field and self.last_modified_field not in fields:
+            fields.append(self.last_modified_field)
+        return fields
+
+    def get_validators(self, queryset):
+        """
+        Return the weak ETag and the Last-Modified timestamp (or None) of the objects in `queryset`,
+        aggregated in a single query
+        """
+        fields = self.get_etag_fields()
+        aggregates = {'count': Count('pk')}
+        aggregates.update(('max_{}'.format(index), Max(field)) for index, field in enumerate(fields))
+        values = queryset.order_by().aggregate(**aggregates)
+
+        last_modified = None
+        if self.last_modified_field:
+            value = values['max_{}'.format(fields.index(self.last_modified_field))]
+            if value is not None:
+                last_modified = calendar.timegm(value.utctimetuple())
+
+        key = [self.request.get_full_path(), self.request.accepted_media_type or '', str(values['count'])]
+        key.extend(str(values['max_{}'.format(index)]) for index in range(len(fields)))
+        etag = 'W/"{}"'.format(hashlib.md5('\n'.join(key).encode()).hexdigest())
+        return etag, last_modified
+
+    def get_conditional_response(self, queryset, respond):
+        """
+        Return 304 Not Modified (or 412 Precondition Failed) if the request's preconditions allow so,
+        otherwise the response of `respond()`, with the validators of `queryset` set
+        """
+        etag, last_modified = self.get_validators(queryset)
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class HalConditionalRetrieveMixin(HalConditionalMixin):
+    def retrieve(self, request, *args, **kwargs):
+        # looking the object up checks the object permissions before any validator is revealed
+        instance = self.get_object()
+        queryset = self.filter_queryset(self.get_queryset()).filter(pk=instance.pk)
+        return self.get_conditional_response(queryset, lambda: Response(self.get_serializer(instance).data))
+
+
+class HalConditionalListMixin(HalConditionalMixin):
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.get_conditional_response(
+            queryset, lambda: super(HalConditionalListMixin, self).list(request, *args, **kwargs))
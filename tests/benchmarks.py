@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of HAL serialization, rendering and pagination on the models of the test project.
+
+    python benchmarks.py                      # run all benchmarks
+    python benchmarks.py -k abundant          # run the benchmarks whose name contains "abundant"
+    python benchmarks.py --save baseline.json
+    python benchmarks.py --compare baseline.json --threshold 1.2
+
+Every benchmark reports the median time of serializing (including the queries) and of rendering its data,
+the number of queries and the peak memory allocated while serializing and rendering. With `--compare`,
+the exit status is 1 if a median time exceeds the saved one by more than `--threshold`, or if more queries
+are made.
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testproject.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.files.base import ContentFile  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import (CaptureQueriesContext, override_settings, setup_test_environment,  # noqa: E402
+                               teardown_test_environment)
+from rest_framework.request import Request  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from drf_hal_json.pagination import HalKeysetPagination, HalPageNumberPagination  # noqa: E402
+from drf_hal_json.renderers import JsonHalRenderer  # noqa: E402
+from testproject.models import (AbundantResource, FileResource, RelatedResource1, RelatedResource2,  # noqa: E402
+                                TestResource)
+from testproject.serializers import (AbundantResourceSerializer, DepthTestResourceSerializer,  # noqa: E402
+                                     FileSerializer, RelatedResource2Serializer, TestResourceSerializer)
+
+LIST_SIZES = (10, 100, 1000)
+NESTED_LIST_SIZES = (10, 100)
+TIMED_KEYS = ('serialize', 'render')
+
+
+class Benchmark(object):
+    """
+    Serializes (and renders) `queryset()` with `serializer_class`, or paginates it with `pagination_class`
+    """
+
+    def __init__(self, name, queryset, serializer_class, pagination_class=None, path='/'):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        self.pagination_class = pagination_class
+        self.path = path
+
+    def serialize(self):
+        request = Request(APIRequestFactory().get(self.path))
+        queryset = self.queryset()
+        if self.pagination_class is None:
+            return self.serializer_class(queryset, many=True, context={'request': request}).data
+        pagination = self.pagination_class()
+        page = pagination.paginate_queryset(queryset, request)
+        data = self.serializer_class(page, many=True, context={'request': request}).data
+        return pagination.get_paginated_response(data).data
+
+    def run(self, repeat):
+        renderer = JsonHalRenderer()
+        data = self.serialize()
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.serialize()
+
+        timings = {key: [] for key in TIMED_KEYS}
+        for i in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            data = self.serialize()
+            timings['serialize'].append(time.perf_counter() - start)
+            start = time.perf_counter()
+            content = renderer.render(data)
+            timings['render'].append(time.perf_counter() - start)
+
+        gc.collect()
+        tracemalloc.start()
+        renderer.render(self.serialize())
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        result = {key: statistics.median(values) for key, values in timings.items()}
+        result.update(queries=len(queries), peak_memory=peak_memory, size=len(content))
+        return result
+
+
+def create_data(size, related_size):
+    AbundantResource.objects.bulk_create(
+        [AbundantResource(name='Abundant Resource {}'.format(i)) for i in range(size)])
+
+    RelatedResource1.objects.bulk_create(
+        [RelatedResource1(name='Related Resource 1 {}'.format(i)) for i in range(related_size)])
+    related_resources_1 = list(RelatedResource1.objects.all())
+    for i in range(size):
+        related_resource_2 = RelatedResource2.objects.create(name='Related Resource 2 {}'.format(i))
+        if i < 100:
+            related_resource_2.related_resources_1.set(related_resources_1)
+        TestResource.objects.create(
+            name='Test Resource {}'.format(i), related_resource_1=related_resources_1[i % related_size],
+            related_resource_2=related_resource_2)
+
+    for i in range(100):
+        file_resource = FileResource()
+        file_resource.file.save('benchmark', ContentFile(b'benchmark'), save=False)
+        file_resource.image.save('benchmark', ContentFile(b'JPEG'), save=False)
+        file_resource.save()
+
+
+def compiled(serializer_class):
+    """
+    Return a subclass of `serializer_class` with the `compile_representation` Meta option
+    """
+    meta = type('Meta', (serializer_class.Meta,), {'compile_representation': True})
+    return type('Compiled' + serializer_class.__name__, (serializer_class,), {'Meta': meta})
+
+
+def get_benchmarks():
+    benchmarks = [
+        Benchmark('abundant-list-{}'.format(size), lambda size=size: AbundantResource.objects.all()[:size],
+                  AbundantResourceSerializer)
+        for size in LIST_SIZES
+    ]
+    planned = TestResourceSerializer.get_query_plan()
+    for size in NESTED_LIST_SIZES:
+        benchmarks.extend([
+            Benchmark('nested-list-{}'.format(size), lambda size=size: TestResource.objects.all()[:size],
+                      TestResourceSerializer),
+            Benchmark('nested-planned-list-{}'.format(size),
+                      lambda size=size: planned.apply(TestResource.objects.all())[:size], TestResourceSerializer),
+            Benchmark('depth-2-list-{}'.format(size), lambda size=size: TestResource.objects.all()[:size],
+                      DepthTestResourceSerializer),
+        ])
+    benchmarks.extend([
+        Benchmark('compiled-abundant-list-1000', lambda: AbundantResource.objects.all()[:1000],
+                  compiled(AbundantResourceSerializer)),
+        Benchmark('compiled-nested-list-100', lambda: planned.apply(TestResource.objects.all())[:100],
+                  compiled(TestResourceSerializer)),
+        Benchmark('m2m-list-100', lambda: RelatedResource2.objects.order_by('pk')[:100], RelatedResource2Serializer),
+        Benchmark('file-list-100', lambda: FileResource.objects.all(), FileSerializer),
+        Benchmark('page-number-page-50', lambda: AbundantResource.objects.order_by('pk'), AbundantResourceSerializer,
+                  HalPageNumberPagination, '/?page=50'),
+        Benchmark('keyset-first-page', lambda: AbundantResource.objects.all(), AbundantResourceSerializer,
+                  HalKeysetPagination),
+    ])
+    return benchmarks
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the ratios of `results` to `baseline`, returning whether a timing regressed beyond `threshold`
+    """
+    regressed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratios = []
+        for key in TIMED_KEYS:
+            ratio = result[key] / baseline[name][key] if baseline[name][key] else 1.0
+            ratios.append('{} x{:.2f}'.format(key, ratio))
+            regressed = regressed or ratio > threshold
+        queries = result['queries'] - baseline[name]['queries']
+        regressed = regressed or queries > 0
+        print('{:<24} {}  queries {:+d}'.format(name, '  '.join(ratios), queries))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-k', dest='keyword', help='only run the benchmarks whose name contains KEYWORD')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark (default: 5)')
+    parser.add_argument('--save', metavar='FILE', help='save the results as baseline to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with the baseline in FILE')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='slowdown over the baseline which counts as regression (default: 1.2)')
+    args = parser.parse_args(argv)
+
+    # the uploaded files and the test database are removed afterwards
+    media_root = tempfile.mkdtemp(prefix='drf_hal_json_benchmarks_')
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(MEDIA_ROOT=media_root):
+            create_data(max(LIST_SIZES + NESTED_LIST_SIZES), related_size=50)
+            results = run_benchmarks(args)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+def run_benchmarks(args):
+    results = {}
+    print('{:<24} {:>12} {:>12} {:>8} {:>12} {:>12}'.format(
+        'benchmark', 'serialize ms', 'render ms', 'queries', 'peak KiB', 'size KiB'))
+    for benchmark in get_benchmarks():
+        if args.keyword and args.keyword not in benchmark.name:
+            continue
+        result = results[benchmark.name] = benchmark.run(args.repeat)
+        print('{:<24} {:>12.2f} {:>12.2f} {:>8} {:>12.1f} {:>12.1f}'.format(
+            benchmark.name, result['serialize'] * 1000, result['render'] * 1000, result['queries'],
+            result['peak_memory'] / 1024, result['size'] / 1024))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(main())
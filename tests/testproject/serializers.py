@@ -50,6 +50,53 @@ class TestResourceSerializer(HalModelSerializer):
         fields = ('self', 'id', 'name', 'related_resource_1', 'related_resource_2')
 
 
+class LinkedTestResourceSerializer(HalModelSerializer):
+    related_resource_1 = HalHyperlinkedRelatedField(
+        read_only=True, view_name='relatedresource1-detail', title_field='name')
+    related_resource_2 = HalHyperlinkedRelatedField(
+        read_only=True, view_name='relatedresource2-detail', title_field='name', name_field='testresource.name')
+
+    class Meta:
+        model = TestResource
+        fields = ('self', 'related_resource_1', 'related_resource_2')
+
+
+class CachedTestResourceSerializer(TestResourceSerializer):
+    class Meta:
+        model = TestResource
+        fields = ('self', 'id', 'name', 'related_resource_1', 'related_resource_2')
+        cache_representation = True
+        cache_version_field = 'created'
+
+
+class ThreadedTestResourceSerializer(TestResourceSerializer):
+    class Meta(TestResourceSerializer.Meta):
+        parallel_workers = 2
+        parallel_chunk_size = 1
+
+
+class HoistedTestResourceSerializer(TestResourceSerializer):
+    class Meta(TestResourceSerializer.Meta):
+        hoist_embedded = True
+
+
+class CuriedTestResourceSerializer(TestResourceSerializer):
+    class Meta:
+        model = TestResource
+        fields = ('self', 'name', 'related_resource_1', 'related_resource_2')
+        curie = 'acme'
+
+
+class DepthTestResourceSerializer(HalModelSerializer):
+    class Meta:
+        model = TestResource
+        fields = ('self', 'name', 'related_resource_1', 'related_resource_2')
+        depth = 2
+
+
+DepthTestResourceSerializer.register_nested_serializer(RelatedResource1, RelatedResource1Serializer)
+
+
 class RelatedResource3Serializer(HalModelSerializer):
 
     class Meta:
@@ -85,6 +132,59 @@ class CustomResourceSerializer(HalModelSerializer):
         return None
 
 
+class WritableCustomResourceSerializer(HalModelSerializer):
+    related_resource_2 = HalHyperlinkedRelatedField(
+        queryset=RelatedResource2.objects.all(), view_name='relatedresource2-detail', allow_null=True, required=False)
+    related_resource_3 = HalHyperlinkedRelatedField(
+        queryset=RelatedResource3.objects.all(), view_name='relatedresource3-detail', lookup_field='name')
+
+    class Meta:
+        model = CustomResource
+        fields = ('self', 'name', 'related_resource_2', 'related_resource_3')
+
+
+class WritableRelatedResource2Serializer(HalModelSerializer):
+    related_resources_1 = HalHyperlinkedRelatedField(
+        many=True, queryset=RelatedResource1.objects.all(), view_name='relatedresource1-detail')
+
+    class Meta:
+        model = RelatedResource2
+        fields = ('self', 'name', 'related_resources_1')
+
+
+class WritableRelatedResource1Serializer(HalModelSerializer):
+    class Meta:
+        model = RelatedResource1
+        fields = ('self', 'name', 'active')
+        self_link_queryset = RelatedResource1.objects.all()
+
+
+class NestedWritableRelatedResource2Serializer(HalModelSerializer):
+    related_resources_1 = WritableRelatedResource1Serializer(many=True, required=False)
+
+    class Meta:
+        model = RelatedResource2
+        fields = ('self', 'name', 'related_resources_1')
+
+
+class NestedWritableTestResourceSerializer(HalModelSerializer):
+    related_resource_1 = WritableRelatedResource1Serializer()
+    related_resource_2 = NestedWritableRelatedResource2Serializer()
+
+    class Meta:
+        model = TestResource
+        fields = ('self', 'name', 'related_resource_1', 'related_resource_2')
+        self_link_queryset = TestResource.objects.all()
+
+
+class NestedWritableRelatedResource1Serializer(HalModelSerializer):
+    testresource_set = NestedWritableTestResourceSerializer(many=True, required=False)
+
+    class Meta:
+        model = RelatedResource1
+        fields = ('self', 'name', 'testresource_set')
+
+
 class SlugRelatedResourceSerializer(HalModelSerializer):
     class Meta:
         model = SlugRelatedResource
@@ -99,6 +199,34 @@ class AbundantResourceSerializer(HalModelSerializer):
         fields = ('self', 'name')
 
 
+class TemplatedAbundantResourceSerializer(AbundantResourceSerializer):
+    class Meta(AbundantResourceSerializer.Meta):
+        extra_kwargs = {'self': {'url_templates': True}}
+
+
+class ThreadedAbundantResourceSerializer(AbundantResourceSerializer):
+    class Meta(AbundantResourceSerializer.Meta):
+        parallel_workers = 2
+        parallel_chunk_size = 10
+
+
+class ProcessedAbundantResourceSerializer(TemplatedAbundantResourceSerializer):
+    class Meta(TemplatedAbundantResourceSerializer.Meta):
+        parallel_workers = 2
+        parallel_executor = 'process'
+        parallel_chunk_size = 10
+
+
+class TemplatedRelatedResource2Serializer(HalModelSerializer):
+    related_resources_1 = HalHyperlinkedRelatedField(
+        many=True, read_only=True, view_name='relatedresource1-detail', url_templates=True)
+
+    class Meta:
+        model = RelatedResource2
+        fields = ('self', 'name', 'related_resources_1')
+        extra_kwargs = {'self': {'url_templates': True}}
+
+
 class HyperlinkedPropertySerializer(HalModelSerializer):
     url_abs = HalHyperlinkedPropertyField()
     url_rel = HalHyperlinkedPropertyField()
@@ -1,10 +1,95 @@
+import datetime
+import decimal
+import importlib.util
+import io
+import json
+import pickle
+import uuid
+from unittest import mock, skipUnless
+
+import django
+from django.apps import apps
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.core.files.base import ContentFile
-from django.test import TestCase
-from drf_hal_json import EMBEDDED_FIELD_NAME, LINKS_FIELD_NAME
+from django.db import connection
+from django.db.models import Q
+from django.db.models.signals import pre_save
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import translation
+from django.utils.functional import lazystr
+from drf_hal_json import EMBEDDED_FIELD_NAME, LINKS_FIELD_NAME, is_hal_content_type
+from drf_hal_json.caching import HalRepresentationCache
+from drf_hal_json.fields import HalHyperlinkedIdentityField, _resolve_path, resolve_path
+from drf_hal_json.instrumentation import InMemoryStatsSink, serialization_finished
+from drf_hal_json.json_backends import get_json_backend
+from drf_hal_json.pagination import HalKeysetPagination, HalLimitOffsetPagination, HalPageNumberPagination
+from drf_hal_json import parallel
+from drf_hal_json.parallel import HalRequestStub
+from drf_hal_json.parsers import HalItemStream, JsonHalParser, JsonHalStreamingParser
+from drf_hal_json.renderers import JsonHalRenderer
+from drf_hal_json.selection import HalFieldSelection
+from drf_hal_json.serializers import HalLayout, HalListSerializer, HalModelSerializer
+from rest_framework.request import Request
+from rest_framework.exceptions import NotFound, ParseError, PermissionDenied, ValidationError
+from rest_framework.relations import Hyperlink
 from rest_framework.reverse import reverse
+from rest_framework.permissions import DjangoModelPermissions
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.utils.serializer_helpers import ReturnDict
 
 from .models import (AbundantResource, CustomResource, FileResource, RelatedResource1, RelatedResource2,
                      RelatedResource3, SlugRelatedResource, TestResource, URLResource)
+from .serializers import (AbundantResourceSerializer, CachedTestResourceSerializer, CuriedTestResourceSerializer,
+                          CustomResourceSerializer, DepthTestResourceSerializer, FileSerializer,
+                          HoistedTestResourceSerializer, HyperlinkedPropertySerializer, LinkedTestResourceSerializer,
+                          RelatedResource1Serializer, RelatedResource2Serializer,
+                          TemplatedAbundantResourceSerializer, TemplatedRelatedResource2Serializer,
+                          NestedWritableRelatedResource1Serializer, NestedWritableRelatedResource2Serializer,
+                          NestedWritableTestResourceSerializer,
+                          TestResourceSerializer, ThreadedAbundantResourceSerializer,
+                          ThreadedTestResourceSerializer, ProcessedAbundantResourceSerializer,
+                          WritableCustomResourceSerializer,
+                          WritableRelatedResource2Serializer)
+from .views import ConditionalTestResourceViewSet, StreamedTestResourceViewSet, WritableCustomResourceViewSet
+
+ASYNC_ORM = django.VERSION >= (4, 1)
+# asgiref is a dependency of Django >= 3.0
+ASGIREF = importlib.util.find_spec('asgiref')
+if ASGIREF:
+    from asgiref.sync import async_to_sync, sync_to_async
+    from drf_hal_json.aio import (AsyncHalListModelMixin, AsyncHalListSerializer, AsyncHalRetrieveModelMixin,
+                                  aserialize, afetch, arender)
+
+
+class AsyncQuerySetStub(object):
+    """
+    The part of a queryset used by `afetch`, for Django versions without the async ORM
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._prefetch_related_lookups = queryset._prefetch_related_lookups
+
+    def prefetch_related(self, *lookups):
+        return AsyncQuerySetStub(self.queryset.prefetch_related(*lookups))
+
+    def aiterator(self):
+        self.objects = None
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.objects is None:
+            self.objects = iter(await sync_to_async(list)(self.queryset))
+        try:
+            return next(self.objects)
+        except StopIteration:
+            raise StopAsyncIteration
 
 
 class HalTest(TestCase):
@@ -199,3 +284,1087 @@ class HalTest(TestCase):
         self.assertIn("custom_link", custom_resource_links)
         self.assertEqual("http://www.example.com", custom_resource_links["custom_link"]["href"])
         self.assertIsNone(custom_resource_links["custom_link_empty"]["href"])
+
+    def test_layout_shared_between_instances(self):
+        first = TestResourceSerializer(self.test_resource_1)
+        second = TestResourceSerializer(self.test_resource_1)
+        self.assertEqual(set(first.fields), set(second.fields))
+        self.assertIs(first.layout, second.layout)
+        self.assertEqual(['self'], first.link_field_names)
+        self.assertEqual(['related_resource_1', 'related_resource_2'], first.embedded_field_names)
+
+    def test_layout_keeps_unplaced_contributions_as_state(self):
+        serializer = FileSerializer(self.file_resource)
+        self.assertIn('file', serializer.fields)
+        self.assertEqual({'title': 'self_title', 'none': 'self_none'}, serializer.link_property_fields['self'])
+        self.assertEqual(['file', 'file_title', 'file_type', 'image'], serializer.layout.state_field_names)
+
+    def test_nested_serializer_classes_are_reused(self):
+        first = DepthTestResourceSerializer(self.test_resource_1).fields['related_resource_2']
+        second = DepthTestResourceSerializer(self.test_resource_1).fields['related_resource_2']
+        self.assertIs(first.__class__, second.__class__)
+        self.assertEqual(1, first.Meta.depth)
+
+    def test_registered_nested_serializer(self):
+        fields = DepthTestResourceSerializer(self.test_resource_1).fields
+        self.assertIsInstance(fields['related_resource_1'], RelatedResource1Serializer)
+        # registrations also apply to the generated nested serializers
+        self.assertIsInstance(fields['related_resource_2'].fields['related_resources_1'].child,
+                              RelatedResource1Serializer)
+
+    def get_serializer_context(self, path='/'):
+        return {'request': Request(APIRequestFactory().get(path))}
+
+    def test_compiled_representation(self):
+        renderer = JsonHalRenderer()
+        serializer_classes = [
+            (AbundantResourceSerializer, AbundantResource), (TestResourceSerializer, TestResource),
+            (DepthTestResourceSerializer, TestResource), (RelatedResource2Serializer, RelatedResource2),
+            (CustomResourceSerializer, CustomResource), (FileSerializer, FileResource),
+            (HyperlinkedPropertySerializer, URLResource),
+        ]
+        for serializer_class, model in serializer_classes:
+            meta = type('Meta', (serializer_class.Meta,), {'compile_representation': True})
+            compiled_class = type('Compiled' + serializer_class.__name__, (serializer_class,), {'Meta': meta})
+            queryset = model.objects.order_by('pk')
+            context = self.get_serializer_context()
+            compiled = compiled_class(queryset, many=True, context=context)
+            self.assertEqual(renderer.render(serializer_class(queryset, many=True, context=context).data),
+                             renderer.render(compiled.data), serializer_class)
+            # one function for all items
+            self.assertIsNotNone(compiled.child.compiled_representation)
+
+        self.test_resource_1.name = None
+        compiled = type('CompiledTestResourceSerializer', (TestResourceSerializer,), {
+            'Meta': type('Meta', (TestResourceSerializer.Meta,), {'compile_representation': True})})
+        self.assertIsNone(compiled(self.test_resource_1, context=self.get_serializer_context()).data['name'])
+
+        # fields which disable URL templates keep building their URLs with reverse()
+        compiled = type('CompiledAbundantResourceSerializer', (AbundantResourceSerializer,), {
+            'Meta': type('Meta', (AbundantResourceSerializer.Meta,), {
+                'compile_representation': True, 'extra_kwargs': {'self': {'url_templates': False}}})})
+        context = self.get_serializer_context()
+        compiled(AbundantResource.objects.order_by('pk'), many=True, context=context).data
+        self.assertFalse(getattr(context['request'], '_hal_url_templates', None))
+
+    def test_parallel_serialization(self):
+        renderer = JsonHalRenderer()
+        queryset = AbundantResource.objects.order_by('pk')
+        context = self.get_serializer_context('/abundant-resources/?name=a')
+        expected = renderer.render(AbundantResourceSerializer(queryset, many=True, context=context).data)
+        for serializer_class in (ThreadedAbundantResourceSerializer, ProcessedAbundantResourceSerializer):
+            with self.assertNumQueries(1):
+                data = serializer_class(queryset.all(), many=True, context=context).data
+            self.assertEqual(50, len(data[EMBEDDED_FIELD_NAME]['items']))
+            self.assertEqual(expected, renderer.render(data), serializer_class)
+
+        # chunks which need queries are serialized by the calling thread
+        self.create_test_resource_2()
+        queryset = TestResource.objects.order_by('pk')
+        self.assertEqual(TestResourceSerializer(queryset, many=True, context=context).data,
+                         ThreadedTestResourceSerializer(queryset, many=True, context=context).data)
+
+    @mock.patch('drf_hal_json.selection.FIELD_SELECTION', True)
+    def test_parallel_serialization_of_embedded_lists(self):
+        class ThreadedRelatedResource1Serializer(HalModelSerializer):
+            class Meta:
+                model = RelatedResource1
+                fields = ('self', 'id', 'active')
+                parallel_workers = 2
+                parallel_chunk_size = 1
+
+        class EmbeddingRelatedResource2Serializer(HalModelSerializer):
+            related_resources_1 = ThreadedRelatedResource1Serializer(many=True)
+
+            class Meta:
+                model = RelatedResource2
+                fields = ('self', 'name', 'related_resources_1')
+
+        # the field selection of the request applies to the root serializer only
+        context = self.get_serializer_context('/related-resources-2/1/?fields=name,related_resources_1')
+        data = EmbeddingRelatedResource2Serializer(self.related_resource_2, context=context).data
+        items = data[EMBEDDED_FIELD_NAME]['related_resources_1']
+        self.assertEqual(2, len(items))
+        self.assertEqual([{LINKS_FIELD_NAME, 'id', 'active'}] * 2, [set(item) for item in items])
+
+    def test_executor_keywords(self):
+        for version_info, process_kwargs, thread_kwargs in (
+                ((3, 5, 0), {}, {}),
+                ((3, 6, 0), {}, {'thread_name_prefix': 'drf_hal_json'}),
+                ((3, 7, 0), {'initializer': parallel.init_process}, {'thread_name_prefix': 'drf_hal_json'})):
+            with mock.patch.dict(parallel._executors, clear=True), \
+                    mock.patch.object(parallel.sys, 'version_info', version_info), \
+                    mock.patch.object(parallel, 'ProcessPoolExecutor') as process_executor, \
+                    mock.patch.object(parallel, 'ThreadPoolExecutor') as thread_executor:
+                parallel.get_executor('process', 2)
+                parallel.get_executor('thread', 2)
+            process_executor.assert_called_once_with(2, **process_kwargs)
+            thread_executor.assert_called_once_with(2, **thread_kwargs)
+
+    def test_request_stub(self):
+        request = Request(APIRequestFactory().get('/abundant-resources/?name=a', secure=True))
+        request._hal_url_templates = {'key': ('https://testserver/abundant-resources/', '/')}
+        stub = pickle.loads(pickle.dumps(HalRequestStub(request)))
+        self.assertEqual(request.build_absolute_uri(), stub.build_absolute_uri())
+        self.assertEqual(request.build_absolute_uri('/related/1/'), stub.build_absolute_uri('/related/1/'))
+        self.assertEqual(['a'], stub.query_params.getlist('name'))
+        self.assertEqual(request._hal_url_templates, stub._hal_url_templates)
+
+    def create_test_resource_2(self):
+        return TestResource.objects.create(
+            name="Test-Resource-2", related_resource_1=self.related_resource_1,
+            related_resource_2=RelatedResource2.objects.create(name="Related-Resource2-2"))
+
+    def test_embedded_identity_map(self):
+        self.create_test_resource_2()
+        context = self.get_serializer_context()
+        with CaptureQueriesContext(connection) as queries:
+            expected = TestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+        # the related resource 1 of the second test resource is neither fetched nor serialized again
+        with self.assertNumQueries(len(queries) - 1), \
+                mock.patch('drf_hal_json.serializers.EMBEDDED_IDENTITY_MAP', True):
+            data = TestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+        self.assertEqual(expected, data)
+        items = data[EMBEDDED_FIELD_NAME]['items']
+        self.assertIs(items[0][EMBEDDED_FIELD_NAME]['related_resource_1'],
+                      items[1][EMBEDDED_FIELD_NAME]['related_resource_1'])
+
+    @mock.patch('drf_hal_json.serializers.EMBEDDED_IDENTITY_MAP', True)
+    def test_streamed_identity_map_per_chunk(self):
+        for i in range(30):
+            TestResource.objects.create(
+                name='Streamed {}'.format(i), related_resource_1=RelatedResource1.objects.create(name=str(i)),
+                related_resource_2=RelatedResource2.objects.create(name=str(i)))
+        request = Request(APIRequestFactory().get('/'))
+        view = StreamedTestResourceViewSet(request=request, format_kwarg=None, stream_chunk_size=10)
+        queryset = TestResource.objects.order_by('pk')
+        serializer = TestResourceSerializer(queryset, many=True, context={'request': request})
+        sizes = []
+        for part in view.stream_list(serializer, queryset, JsonHalRenderer(), 'application/hal+json'):
+            sizes.append(len(getattr(serializer, '_hal_identity_map', {})))
+        # the resources embedded by the 10 test resources of the first chunk, whose related resource 2 of
+        # `setUp` embeds 2 more, instead of the 62 resources of all chunks
+        self.assertEqual(22, max(sizes))
+
+    def test_hoist_embedded(self):
+        self.create_test_resource_2()
+        context = self.get_serializer_context()
+        expected = TestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+        data = HoistedTestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+        embedded = data[EMBEDDED_FIELD_NAME]
+        self.assertEqual(['related_resource_1', 'related_resource_2', 'items'], list(embedded))
+        self.assertEqual([expected[EMBEDDED_FIELD_NAME]['items'][0][EMBEDDED_FIELD_NAME]['related_resource_1']],
+                         embedded['related_resource_1'])
+        self.assertEqual([item[EMBEDDED_FIELD_NAME]['related_resource_2']
+                          for item in expected[EMBEDDED_FIELD_NAME]['items']], embedded['related_resource_2'])
+        for item, expected_item in zip(embedded['items'], expected[EMBEDDED_FIELD_NAME]['items']):
+            self.assertNotIn(EMBEDDED_FIELD_NAME, item)
+            self.assertEqual(expected_item[LINKS_FIELD_NAME], item[LINKS_FIELD_NAME])
+
+    def test_url_templates(self):
+        queryset = AbundantResource.objects.all()
+        with mock.patch('rest_framework.relations.reverse', wraps=reverse) as reverse_mock:
+            templated = TemplatedAbundantResourceSerializer(
+                queryset, many=True, context=self.get_serializer_context()).data
+        self.assertEqual(1, reverse_mock.call_count)
+        plain = AbundantResourceSerializer(queryset, many=True, context=self.get_serializer_context()).data
+        self.assertEqual(plain, templated)
+
+    def test_url_templates_with_path_converters(self):
+        resource = AbundantResource.objects.order_by('pk').first()
+        request = self.get_serializer_context()['request']
+        for view_name, templated in (('padded-abundantresource-detail', False), ('int-abundantresource-detail', True)):
+            field = HalHyperlinkedIdentityField(view_name=view_name, url_templates=True)
+            self.assertEqual(reverse(view_name, kwargs={'pk': resource.pk}, request=request),
+                             field.get_url(resource, view_name, request, None))
+            self.assertEqual(templated, request._hal_url_templates[(view_name, 'pk', None)] is not None)
+
+    def test_url_templates_for_related_links(self):
+        context = self.get_serializer_context()
+        templated = TemplatedRelatedResource2Serializer(self.related_resource_2, context=context).data
+        plain = RelatedResource2Serializer(self.related_resource_2, context=context).data
+        self.assertEqual(plain[LINKS_FIELD_NAME]['self'], templated[LINKS_FIELD_NAME]['self'])
+        self.assertEqual([link['href'] for link in plain[LINKS_FIELD_NAME]['related_resources']],
+                         [link['href'] for link in templated[LINKS_FIELD_NAME]['related_resources_1']])
+        self.assertEqual({('relatedresource1-detail', 'pk', None), ('relatedresource2-detail', 'pk', None)},
+                         set(context['request']._hal_url_templates))
+
+    def test_link_properties_on_single_relations(self):
+        data = LinkedTestResourceSerializer(self.test_resource_1, context=self.get_serializer_context()).data
+        self.assertEqual({'href': self.TESTSERVER_URL + '/related-resources-1/1/', 'title': 'Related-Resource1'},
+                         data[LINKS_FIELD_NAME]['related_resource_1'])
+        self.assertEqual('Related-Resource2', data[LINKS_FIELD_NAME]['related_resource_2']['title'])
+        # dotted property paths follow relations
+        self.assertEqual('Test-Resource', data[LINKS_FIELD_NAME]['related_resource_2']['name'])
+
+    def test_query_plan(self):
+        plan = TestResourceSerializer.get_query_plan()
+        self.assertEqual(['related_resource_1', 'related_resource_2'], plan.select_related)
+        self.assertEqual(['related_resource_2__related_resources_1'], plan.prefetch_related)
+        # `RelatedResource1Serializer.get_name` may read any column
+        self.assertIsNone(plan.only)
+        self.assertEqual(['name'], AbundantResourceSerializer.get_query_plan().only)
+
+    def test_query_plan_mixin(self):
+        with self.assertNumQueries(2):
+            planned = self.client.get("/planned-test-resources/").data
+        self.assertEqual(self.client.get("/test-resources/").data[EMBEDDED_FIELD_NAME],
+                         planned[EMBEDDED_FIELD_NAME])
+
+    def test_representation_cache(self):
+        cache.clear()
+        context = self.get_serializer_context()
+        expected = TestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+        for i in range(2):
+            cached = CachedTestResourceSerializer(TestResource.objects.all(), many=True, context=context).data
+            self.assertEqual(json.loads(json.dumps(expected)), json.loads(json.dumps(cached)))
+
+        # the second pass only reads the list and the cache
+        queryset = TestResource.objects.all()
+        list(queryset)
+        with self.assertNumQueries(0):
+            CachedTestResourceSerializer(queryset, many=True, context=context).data
+
+        # embedded and many-to-many related objects invalidate the representations
+        self.related_resource_1.name = 'Renamed'
+        self.related_resource_1.save()
+        data = CachedTestResourceSerializer(self.test_resource_1, context=context).data
+        self.assertEqual('Renamed', data[EMBEDDED_FIELD_NAME]['related_resource_1'][LINKS_FIELD_NAME]['self']['title'])
+        self.related_resource_2.related_resources_1.remove(self.nested_related_resource_1_1)
+        data = CachedTestResourceSerializer(self.test_resource_1, context=context).data
+        links = data[EMBEDDED_FIELD_NAME]['related_resource_2'][LINKS_FIELD_NAME]
+        self.assertEqual(1, len(links['related_resources']))
+
+    def test_representation_cache_invalidated_without_serializer(self):
+        cache.clear()
+        # a process which writes the models without having cached representations itself
+        with mock.patch.dict(HalModelSerializer._representation_caches, clear=True):
+            generation = HalRepresentationCache(CachedTestResourceSerializer).get_generation()
+            AbundantResource.objects.first().save()
+            self.assertEqual(generation, HalRepresentationCache(CachedTestResourceSerializer).get_generation())
+            self.related_resource_1.save()
+            self.assertNotEqual(generation, HalRepresentationCache(CachedTestResourceSerializer).get_generation())
+        self.assertTrue(apps.is_installed('drf_hal_json'))
+
+    def test_representation_cache_signals(self):
+        # only the models of serializers which cache their representations are connected
+        with mock.patch('drf_hal_json.caching.invalidate_model') as invalidate_model:
+            AbundantResource.objects.first().save()
+            User.objects.create(username='writer').groups.clear()
+            invalidate_model.assert_not_called()
+            self.related_resource_1.save()
+            invalidate_model.assert_called_once_with(RelatedResource1)
+
+            class CachedAbundantResourceSerializer(HalModelSerializer):
+                class Meta:
+                    model = AbundantResource
+                    fields = ('self', 'name')
+                    cache_representation = True
+
+            AbundantResource.objects.first().save()
+            invalidate_model.assert_called_with(AbundantResource)
+
+    def test_conditional_retrieve(self):
+        resp = self.client.get("/conditional-test-resources/1/")
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(self.client.get("/test-resources/1/").data[EMBEDDED_FIELD_NAME],
+                         resp.data[EMBEDDED_FIELD_NAME])
+        etag = resp['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        # the object lookup and the aggregation, nothing is serialized
+        with self.assertNumQueries(2):
+            resp = self.client.get("/conditional-test-resources/1/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, resp.status_code)
+        self.assertEqual(etag, resp['ETag'])
+        resp = self.client.get("/conditional-test-resources/1/", HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+        self.assertEqual(304, resp.status_code)
+
+        # changes of embedded resources change the ETag
+        self.related_resource_1.save()
+        resp = self.client.get("/conditional-test-resources/1/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, resp.status_code)
+        self.assertNotEqual(etag, resp['ETag'])
+
+    def test_conditional_requires_validator_fields(self):
+        with mock.patch.multiple(ConditionalTestResourceViewSet, etag_fields=(), last_modified_field=None):
+            with self.assertRaises(ImproperlyConfigured):
+                self.client.get("/conditional-test-resources/1/")
+
+    def test_conditional_list(self):
+        etag = self.client.get("/conditional-test-resources/")['ETag']
+        self.assertEqual(304, self.client.get("/conditional-test-resources/", HTTP_IF_NONE_MATCH=etag).status_code)
+        # validators depend on the query string
+        resp = self.client.get("/conditional-test-resources/?page=1", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, resp.status_code)
+
+        TestResource.objects.create(
+            name="Test-Resource-2", related_resource_1=self.related_resource_1,
+            related_resource_2=RelatedResource2.objects.create(name="Related-Resource2-2"))
+        resp = self.client.get("/conditional-test-resources/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, len(resp.data[EMBEDDED_FIELD_NAME]['items']))
+
+    @mock.patch('drf_hal_json.selection.FIELD_SELECTION', True)
+    def test_field_selection(self):
+        data = self.client.get("/test-resources/1/?fields=name,related_resource_1").data
+        self.assertEqual({LINKS_FIELD_NAME, EMBEDDED_FIELD_NAME, 'name'}, set(data))
+        self.assertEqual({'self', 'related_resource_1'}, set(data[LINKS_FIELD_NAME]))
+        self.assertEqual({'related_resource_1'}, set(data[EMBEDDED_FIELD_NAME]))
+
+        data = self.client.get("/test-resources/1/?embed=related_resource_1").data
+        self.assertEqual({'related_resource_1'}, set(data[EMBEDDED_FIELD_NAME]))
+        self.assertEqual({'href': self.TESTSERVER_URL + '/related-resources-2/1/'},
+                         data[LINKS_FIELD_NAME]['related_resource_2'])
+        # contributions to the self link of the embedded resource stay in place
+        self.assertEqual('Related-Resource1', data[LINKS_FIELD_NAME]['related_resource_1']['title'])
+
+        data = self.client.get("/test-resources/?embed=&links=").data
+        item = data[EMBEDDED_FIELD_NAME]['items'][0]
+        self.assertEqual({LINKS_FIELD_NAME, 'id', 'name'}, set(item))
+        self.assertEqual({'self'}, set(item[LINKS_FIELD_NAME]))
+
+    @mock.patch('drf_hal_json.selection.FIELD_SELECTION', True)
+    def test_field_selection_layouts_bounded(self):
+        field_names = ['self', 'id', 'name', 'related_resource_1', 'related_resource_2']
+        with mock.patch.object(HalLayout, 'max_layouts', 4):
+            for i in range(1, 2 ** len(field_names)):
+                fields = ','.join(name for bit, name in enumerate(field_names) if i & 1 << bit)
+                self.client.get("/test-resources/1/?fields=" + fields)
+                self.assertLessEqual(len(HalLayout._cache[TestResourceSerializer]), 4)
+
+    @mock.patch('drf_hal_json.selection.FIELD_SELECTION', True)
+    def test_field_selection_ignored_for_writes(self):
+        data = {
+            LINKS_FIELD_NAME: {
+                'related_resource_3': {'href': self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'},
+            },
+            'name': 'Selected',
+        }
+        resp = self.post_hal("/writable-custom-resources/?fields=name", data)
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual(self.related_resource_3, CustomResource.objects.get(name='Selected').related_resource_3)
+
+        resp = self.post_hal("/writable-custom-resources/?fields=related_resource_3", {'name': 'Unlinked'})
+        self.assertEqual(400, resp.status_code)
+        self.assertIn('related_resource_3', resp.data)
+
+    @mock.patch('drf_hal_json.selection.FIELD_SELECTION', True)
+    def test_field_selection_query_plan(self):
+        plan = TestResourceSerializer.get_query_plan(HalFieldSelection(embed=frozenset()))
+        self.assertEqual([], plan.select_related)
+        self.assertEqual([], plan.prefetch_related)
+        self.assertEqual(['id', 'name', 'related_resource_1', 'related_resource_2'], plan.only)
+
+        with self.assertNumQueries(1):
+            data = self.client.get("/planned-test-resources/?embed=related_resource_1").data
+        self.assertEqual({'related_resource_1'}, set(data[EMBEDDED_FIELD_NAME]['items'][0][EMBEDDED_FIELD_NAME]))
+
+    @mock.patch('drf_hal_json.serializers.CURIES', [{'name': 'acme', 'href': 'http://docs.example.com/{rel}'}])
+    def test_curies(self):
+        data = CuriedTestResourceSerializer(self.test_resource_1, context=self.get_serializer_context()).data
+        self.assertEqual([{'name': 'acme', 'href': 'http://docs.example.com/{rel}', 'templated': True}],
+                         data[LINKS_FIELD_NAME]['curies'])
+        self.assertEqual({'self', 'curies', 'acme:related_resource_1', 'acme:related_resource_2'},
+                         set(data[LINKS_FIELD_NAME]))
+        self.assertEqual({'acme:related_resource_1', 'acme:related_resource_2'}, set(data[EMBEDDED_FIELD_NAME]))
+        # embedded documents are no top-level documents
+        self.assertNotIn('curies', data[EMBEDDED_FIELD_NAME]['acme:related_resource_1'][LINKS_FIELD_NAME])
+
+        data = self.client.get("/abundant-unpaged/").data
+        self.assertIn('curies', data[LINKS_FIELD_NAME])
+        self.assertNotIn('curies', data[EMBEDDED_FIELD_NAME]['items'][0][LINKS_FIELD_NAME])
+
+    @mock.patch('drf_hal_json.RELATIVE_HREFS', True)
+    def test_relative_hrefs(self):
+        data = self.client.get("/test-resources/1/").data
+        self.assertEqual('/test-resources/1/', data[LINKS_FIELD_NAME]['self']['href'])
+        self.assertEqual('/related-resources-1/1/', data[LINKS_FIELD_NAME]['related_resource_1']['href'])
+        embedded = data[EMBEDDED_FIELD_NAME]['related_resource_2']
+        self.assertEqual('/related-resources-1/2/', embedded[LINKS_FIELD_NAME]['related_resources'][0]['href'])
+
+        data = self.client.get("/abundant-resources/?name=a").data
+        self.assertEqual('/abundant-resources/?name=a', data[LINKS_FIELD_NAME]['self']['href'])
+        self.assertTrue(data[LINKS_FIELD_NAME]['next']['href'].startswith('/abundant-resources/?'))
+
+    @mock.patch('drf_hal_json.instrumentation.INSTRUMENTATION', True)
+    @mock.patch('drf_hal_json.serializers.INSTRUMENTATION', True)
+    def test_instrumentation(self):
+        sink = InMemoryStatsSink()
+        received = []
+
+        def receiver(sender, metrics, **kwargs):
+            received.append((sender, metrics))
+
+        serialization_finished.connect(receiver)
+        self.addCleanup(serialization_finished.disconnect, receiver)
+        with mock.patch('drf_hal_json.instrumentation.get_stats_sink', return_value=sink):
+            resp = self.client.get("/test-resources/1/")
+
+        self.assertEqual([TestResourceSerializer], [sender for sender, metrics in received])
+        metrics = received[0][1]
+        self.assertEqual(['serialize', 'db', 'render'], list(metrics.phases))
+        self.assertEqual(5, metrics.queries)
+        # embedded relations include the queries of the resources they embed
+        self.assertEqual({
+            'TestResourceSerializer.related_resource_1': 1,
+            'TestResourceSerializer.related_resource_2': 4,
+            'RelatedResource2Serializer.related_resources_1_noself': 1,
+        }, {relation: queries for relation, (duration, queries) in metrics.relations.items()})
+        self.assertIn('HalManyRelatedField', metrics.field_types)
+        self.assertEqual(len(resp.content), metrics.size)
+        self.assertRegex(resp['Server-Timing'],
+                         r'^hal-serialize;dur=[\d.]+, hal-db;dur=[\d.]+;desc="5 queries", hal-render;dur=[\d.]+$')
+
+        tags = {'serializer': 'TestResourceSerializer'}
+        self.assertEqual([5], sink.get('hal.queries', tags))
+        self.assertEqual([len(resp.content)], sink.get('hal.payload_size', tags))
+        self.assertEqual([4], sink.get('hal.embedded.queries',
+                                       dict(tags, relation='TestResourceSerializer.related_resource_2')))
+        self.assertEqual(1, len(sink.get('hal.render')))
+
+        # list serializers record one pass for all items
+        received.clear()
+        self.client.get("/abundant-unpaged/")
+        self.assertEqual(1, len(received))
+        self.assertEqual('AbundantResourceSerializer', received[0][1].serializer_name)
+
+    def test_instrumentation_disabled(self):
+        resp = self.client.get("/test-resources/1/")
+        self.assertFalse(resp.has_header('Server-Timing'))
+
+    def post_hal(self, path, data):
+        return self.client.post(path, json.dumps(data), content_type='application/hal+json')
+
+    def test_create_with_links(self):
+        data = {
+            LINKS_FIELD_NAME: {
+                'related_resource_3': {'href': self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'},
+            },
+            'name': 'Linked',
+        }
+        resp = self.post_hal("/writable-custom-resources/", data)
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual(self.related_resource_3, CustomResource.objects.get(name='Linked').related_resource_3)
+
+        serializer = WritableCustomResourceSerializer(data=data, context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual({'related_resource_3'}, set(data[LINKS_FIELD_NAME]))
+
+    def test_bulk_create(self):
+        related_resource_3_href = self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'
+        items = [
+            {LINKS_FIELD_NAME: {'related_resource_3': {'href': related_resource_3_href}}, 'name': 'Bulk {}'.format(i)}
+            for i in range(3)
+        ]
+        items.append({
+            LINKS_FIELD_NAME: {
+                'self': {'href': self.TESTSERVER_URL + '/custom-resources/{}/'.format(self.custom_resource_1.pk)},
+                'related_resource_3': {'href': related_resource_3_href},
+            },
+            'name': 'Updated',
+        })
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(201, resp.status_code, resp.content)
+        # the linked resources are fetched once for all items
+        self.assertEqual(1, len([query for query in queries if 'testproject_relatedresource3' in query['sql']
+                                 and query['sql'].startswith('SELECT')]))
+
+        created = resp.data[EMBEDDED_FIELD_NAME]['items']
+        self.assertEqual(['Bulk 0', 'Bulk 1', 'Bulk 2', 'Updated'], [item['name'] for item in created])
+        self.assertEqual(self.TESTSERVER_URL + '/custom-resources/{}/'.format(self.custom_resource_1.pk),
+                         created[3][LINKS_FIELD_NAME]['self']['href'])
+        self.assertEqual(3, CustomResource.objects.filter(name__startswith='Bulk').count())
+        self.assertEqual('Updated', CustomResource.objects.get(pk=self.custom_resource_1.pk).name)
+
+        items = [{LINKS_FIELD_NAME: {'related_resource_3': {'href': self.TESTSERVER_URL + '/related-resources-3/x/'}},
+                  'name': 'Invalid'}]
+        resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(400, resp.status_code)
+        self.assertFalse(CustomResource.objects.filter(name='Invalid').exists())
+
+    def test_bulk_update_scoped_to_view(self):
+        href = self.TESTSERVER_URL + '/custom-resources/{}/'.format(self.custom_resource_1.pk)
+        items = [{LINKS_FIELD_NAME: {
+            'self': {'href': href},
+            'related_resource_3': {'href': self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'},
+        }, 'name': 'Overwritten'}]
+        queryset = CustomResource.objects.exclude(pk=self.custom_resource_1.pk)
+        with mock.patch.object(WritableCustomResourceViewSet, 'queryset', queryset):
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(400, resp.status_code)
+
+        with mock.patch.object(WritableCustomResourceViewSet, 'check_object_permissions',
+                               side_effect=PermissionDenied()):
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(403, resp.status_code)
+        self.assertEqual('Custom-Resource-1', CustomResource.objects.get(pk=self.custom_resource_1.pk).name)
+
+        # views accept self links only with update_by_self_link
+        with mock.patch.object(WritableCustomResourceViewSet, 'update_by_self_link', False):
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(400, resp.status_code)
+        self.assertIn('self', json.loads(resp.content.decode())[0])
+
+        # the linked objects are changed, the model permissions of the view require `change`, not `add`
+        user = User.objects.create(username='writer')
+        user.user_permissions.add(Permission.objects.get(codename='add_customresource'))
+        view = WritableCustomResourceViewSet.as_view({'post': 'create'})
+        for codename, status_code in (('add_customresource', 403), ('change_customresource', 201)):
+            user.user_permissions.add(Permission.objects.get(codename=codename))
+            user = User.objects.get(pk=user.pk)
+            request = APIRequestFactory().post("/writable-custom-resources/",
+                                               json.dumps({EMBEDDED_FIELD_NAME: {'items': items}}),
+                                               content_type='application/hal+json')
+            force_authenticate(request, user)
+            with mock.patch.object(WritableCustomResourceViewSet, 'permission_classes', [DjangoModelPermissions]):
+                self.assertEqual(status_code, view(request).status_code)
+        self.assertEqual('Overwritten', CustomResource.objects.get(pk=self.custom_resource_1.pk).name)
+
+        # without a view, self links are only accepted with the self_link_queryset Meta option
+        serializer = WritableCustomResourceSerializer(data=items, many=True, context=self.get_serializer_context())
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('self', serializer.errors[0])
+
+    def test_self_link_of_single_resource_ignored(self):
+        context = self.get_serializer_context()
+        data = json.loads(json.dumps(WritableCustomResourceSerializer(self.custom_resource_1, context=context).data))
+        data['name'] = 'Sent back'
+        serializer = WritableCustomResourceSerializer(self.custom_resource_1, data=data, context=context)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual('Sent back', serializer.save().name)
+
+        data[LINKS_FIELD_NAME]['self'] = {'href': self.TESTSERVER_URL + '/custom-resources/unknown/'}
+        resp = self.post_hal("/writable-custom-resources/", data)
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual(2, CustomResource.objects.filter(name='Sent back').count())
+
+    def test_bulk_save_respects_overrides_and_cache(self):
+        created = []
+
+        class CreatingSerializer(WritableCustomResourceSerializer):
+            def create(self, validated_data):
+                created.append(validated_data['name'])
+                return super(CreatingSerializer, self).create(validated_data)
+
+        related_resource_3_href = self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'
+        items = [{LINKS_FIELD_NAME: {'related_resource_3': {'href': related_resource_3_href}},
+                  'name': 'Override {}'.format(i)} for i in range(2)]
+        serializer = CreatingSerializer(data=items, many=True, context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(['Override 0', 'Override 1'], created)
+
+        # bulk updates send no post_save signals
+        items[0][LINKS_FIELD_NAME]['self'] = {
+            'href': self.TESTSERVER_URL + '/custom-resources/{}/'.format(self.custom_resource_1.pk)}
+        with mock.patch('drf_hal_json.serializers.invalidate_model') as invalidate_model:
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items[:1]}})
+        self.assertEqual(201, resp.status_code, resp.content)
+        invalidate_model.assert_called_once_with(CustomResource)
+
+        # Django < 2.2 saves the updated objects one by one
+        with mock.patch('drf_hal_json.serializers.BULK_UPDATE', False):
+            resp = self.post_hal("/writable-custom-resources/",
+                                 {EMBEDDED_FIELD_NAME: {'items': [dict(items[0], name='Saved')]}})
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual('Saved', CustomResource.objects.get(pk=self.custom_resource_1.pk).name)
+
+        # bulk operations would skip the receivers of the model
+        saved = []
+
+        def receiver(instance, **kwargs):
+            saved.append(instance.name)
+
+        pre_save.connect(receiver, sender=CustomResource)
+        try:
+            resp = self.post_hal("/writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        finally:
+            pre_save.disconnect(receiver, sender=CustomResource)
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual(['Override 0', 'Override 1'], sorted(saved))
+        self.assertTrue(HalListSerializer.can_bulk_save(CustomResource))
+        with mock.patch.object(CustomResource, 'save', lambda self, *args, **kwargs: None):
+            self.assertFalse(HalListSerializer.can_bulk_save(CustomResource))
+
+    def test_streaming_create(self):
+        related_resource_3_href = self.TESTSERVER_URL + '/related-resources-3/Related-Resource3/'
+        items = [{LINKS_FIELD_NAME: {'related_resource_3': {'href': related_resource_3_href}},
+                  'name': 'Streamed {}'.format(i)} for i in range(5)]
+        resp = self.post_hal("/streaming-writable-custom-resources/", {EMBEDDED_FIELD_NAME: {'items': items}})
+        self.assertEqual(201, resp.status_code, resp.content)
+        created = CustomResource.objects.filter(name__startswith='Streamed').order_by('pk')
+        self.assertEqual(['Streamed {}'.format(i) for i in range(5)], [resource.name for resource in created])
+        self.assertEqual([{'href': self.TESTSERVER_URL + '/custom-resources/{}/'.format(resource.pk)}
+                          for resource in created], resp.data[LINKS_FIELD_NAME]['items'])
+
+        # single resources are created as usual
+        resp = self.post_hal("/streaming-writable-custom-resources/", items[0])
+        self.assertEqual(201, resp.status_code, resp.content)
+        self.assertEqual('Streamed 0', resp.data['name'])
+
+        # an invalid item after the first chunk rolls back the whole document
+        items[3] = {'name': 'Invalid'}
+        resp = self.post_hal("/streaming-writable-custom-resources/",
+                             {EMBEDDED_FIELD_NAME: {'items': [dict(item, name='Rolled back') for item in items]}})
+        self.assertEqual(400, resp.status_code)
+        self.assertEqual(['3'], list(json.loads(resp.content.decode())['items']))
+        self.assertFalse(CustomResource.objects.filter(name='Rolled back').exists())
+
+    def test_resolve_path_cache(self):
+        _resolve_path.cache_clear()
+        self.assertEqual('testresource-detail', resolve_path('/test-resources/1/').view_name)
+        resolve_path('/test-resources/1/')
+        self.assertEqual(1, _resolve_path.cache_info().currsize)
+        # the language is part of the key
+        with translation.override('de'):
+            resolve_path('/test-resources/1/')
+        self.assertEqual(2, _resolve_path.cache_info().currsize)
+        # and changing the URL conf clears the cache
+        with override_settings(ROOT_URLCONF='testproject.urls'):
+            self.assertEqual(0, _resolve_path.cache_info().currsize)
+
+    def test_many_links_resolved_in_one_query(self):
+        resources = [RelatedResource1.objects.create(name='Linked {}'.format(i)) for i in range(20)]
+        hrefs = [self.TESTSERVER_URL + '/related-resources-1/{}/'.format(resource.pk) for resource in resources]
+        data = {
+            LINKS_FIELD_NAME: {'related_resources_1': [{'href': href} for href in hrefs + hrefs[:5]]},
+            'name': 'Updated',
+        }
+        serializer = WritableRelatedResource2Serializer(
+            self.related_resource_2, data=data, context=self.get_serializer_context())
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(resources + resources[:5], serializer.validated_data['related_resources_1'])
+        serializer.save()
+        self.assertEqual(set(resources), set(self.related_resource_2.related_resources_1.all()))
+
+        data[LINKS_FIELD_NAME]['related_resources_1'].append({'href': self.TESTSERVER_URL + '/related-resources-1/0/'})
+        serializer = WritableRelatedResource2Serializer(
+            self.related_resource_2, data=data, context=self.get_serializer_context())
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('related_resources_1', serializer.errors)
+
+    def test_write_embedded(self):
+        existing_href = self.TESTSERVER_URL + '/related-resources-1/{}/'.format(self.nested_related_resource_1_1.pk)
+        data = {
+            'name': 'Nested',
+            EMBEDDED_FIELD_NAME: {
+                'related_resource_1': {'name': 'New 1'},
+                'related_resource_2': {
+                    'name': 'New 2',
+                    EMBEDDED_FIELD_NAME: {
+                        'related_resources_1': [
+                            {'name': 'New 1.1'},
+                            {LINKS_FIELD_NAME: {'self': {'href': existing_href}}, 'name': 'Renamed 1.1'},
+                        ],
+                    },
+                },
+            },
+        }
+        serializer = NestedWritableTestResourceSerializer(data=data, context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        instance = serializer.save()
+
+        self.assertEqual('New 1', instance.related_resource_1.name)
+        self.assertEqual('New 2', instance.related_resource_2.name)
+        self.assertEqual(['New 1.1', 'Renamed 1.1'],
+                         sorted(instance.related_resource_2.related_resources_1.values_list('name', flat=True)))
+        self.nested_related_resource_1_1.refresh_from_db()
+        self.assertEqual('Renamed 1.1', self.nested_related_resource_1_1.name)
+        # the output round-trips
+        embedded = serializer.data[EMBEDDED_FIELD_NAME]['related_resource_2'][EMBEDDED_FIELD_NAME]
+        self.assertEqual({'New 1.1', 'Renamed 1.1'}, {item['name'] for item in embedded['related_resources_1']})
+
+    def test_write_embedded_reverse_relation(self):
+        data = {
+            'name': 'Parent',
+            EMBEDDED_FIELD_NAME: {
+                'testresource_set': [
+                    {'name': 'Child {}'.format(i), EMBEDDED_FIELD_NAME: {
+                        'related_resource_1': {'name': 'Other {}'.format(i)},
+                        'related_resource_2': {'name': 'One {}'.format(i)},
+                    }} for i in range(2)
+                ],
+            },
+        }
+        serializer = NestedWritableRelatedResource1Serializer(data=data, context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        instance = serializer.save()
+        # the reverse foreign key is set by the parent, overriding the embedded resource
+        self.assertEqual(['Child 0', 'Child 1'], sorted(instance.testresource_set.values_list('name', flat=True)))
+
+        serializer = NestedWritableRelatedResource1Serializer(data={
+            'name': 'Invalid', EMBEDDED_FIELD_NAME: {'testresource_set': [{'name': 'Child'}]}})
+        self.assertFalse(serializer.is_valid())
+
+        # resources of other objects are not moved to the instance
+        child_href = self.TESTSERVER_URL + '/test-resources/{}/'.format(self.test_resource_1.pk)
+        child = {LINKS_FIELD_NAME: {'self': {'href': child_href}}, 'name': 'Moved', EMBEDDED_FIELD_NAME: {
+            'related_resource_1': {'name': 'Other'}, 'related_resource_2': {'name': 'One'}}}
+        serializer = NestedWritableRelatedResource1Serializer(
+            data={'name': 'Thief', EMBEDDED_FIELD_NAME: {'testresource_set': [child]}},
+            context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.test_resource_1.refresh_from_db()
+        self.assertEqual(self.related_resource_1, self.test_resource_1.related_resource_1)
+        self.assertFalse(RelatedResource1.objects.filter(name='Thief').exists())
+
+        serializer = NestedWritableRelatedResource1Serializer(
+            self.related_resource_1, data={'name': 'Owner', EMBEDDED_FIELD_NAME: {'testresource_set': [child]}},
+            context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.test_resource_1.refresh_from_db()
+        self.assertEqual('Moved', self.test_resource_1.name)
+
+    def test_write_embedded_many_to_many_keeps_members(self):
+        data = {'name': 'Updated', EMBEDDED_FIELD_NAME: {'related_resources_1': [{'name': 'Added'}]}}
+        serializer = NestedWritableRelatedResource2Serializer(
+            self.related_resource_2, data=data, context=self.get_serializer_context())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(['Added', 'Nested-Related-Resource11', 'Nested-Related-Resource12'],
+                         sorted(self.related_resource_2.related_resources_1.values_list('name', flat=True)))
+
+    def test_streamed_list(self):
+        resp = self.client.get("/abundant-streamed/")
+        self.assertTrue(resp.streaming)
+        self.assertEqual('application/hal+json', resp['Content-Type'])
+        streamed = json.loads(b''.join(resp.streaming_content).decode())
+        unpaged = self.client.get("/abundant-unpaged/").data
+        self.assertEqual(self.TESTSERVER_URL + '/abundant-streamed/', streamed[LINKS_FIELD_NAME]['self']['href'])
+        self.assertEqual(50, len(streamed[EMBEDDED_FIELD_NAME]['items']))
+        self.assertEqual(unpaged[EMBEDDED_FIELD_NAME], streamed[EMBEDDED_FIELD_NAME])
+
+    def test_streamed_list_prefetches_per_chunk(self):
+        resp = self.client.get("/streamed-test-resources/")
+        with self.assertNumQueries(2):
+            streamed = json.loads(b''.join(resp.streaming_content).decode())
+        self.assertEqual(self.client.get("/test-resources/").data[EMBEDDED_FIELD_NAME], streamed[EMBEDDED_FIELD_NAME])
+
+    @skipUnless(ASYNC_ORM, 'the async ORM needs Django >= 4.1')
+    async def test_async_serialization(self):
+        queryset = TestResourceSerializer.get_query_plan().apply(TestResource.objects.order_by('pk'))
+        context = self.get_serializer_context()
+        expected = await sync_to_async(lambda: TestResourceSerializer(queryset, many=True, context=context).data)()
+
+        serializer = AsyncHalListSerializer(child=TestResourceSerializer(), instance=queryset, context=context)
+        self.assertEqual(expected, await serializer.adata())
+        self.assertIsInstance(serializer.instance, list)
+        self.assertEqual(expected, await aserialize(TestResourceSerializer(queryset, many=True, context=context)))
+
+        renderer = JsonHalRenderer()
+        self.assertEqual(renderer.render(expected), await arender(renderer, expected))
+
+    @skipUnless(ASGIREF, 'asgiref is not installed')
+    def test_afetch(self):
+        queryset = TestResource.objects.order_by('pk').prefetch_related(
+            'related_resource_2__related_resources_1', 'related_resource_1')
+        if not ASYNC_ORM:
+            queryset = AsyncQuerySetStub(queryset)
+        # the objects, then related_resource_2, its related_resources_1 and related_resource_1
+        with self.assertNumQueries(4):
+            objects = async_to_sync(afetch)(queryset)
+        self.assertEqual(list(TestResource.objects.order_by('pk')), objects)
+        with self.assertNumQueries(0):
+            [list(obj.related_resource_2.related_resources_1.all()) for obj in objects]
+            [obj.related_resource_1 for obj in objects]
+
+    @skipUnless(ASYNC_ORM and importlib.util.find_spec('adrf'), 'async views need Django >= 4.1 and adrf')
+    async def test_async_views(self):
+        from adrf.viewsets import GenericViewSet
+
+        class AsyncTestResourceViewSet(AsyncHalRetrieveModelMixin, AsyncHalListModelMixin, GenericViewSet):
+            serializer_class = TestResourceSerializer
+            queryset = TestResource.objects.prefetch_related('related_resource_2__related_resources_1')
+
+        request = APIRequestFactory().get('/test-resources/')
+        response = await AsyncTestResourceViewSet.as_view({'get': 'list'})(request)
+        expected = await sync_to_async(self.client.get)('/test-resources/')
+        self.assertEqual(expected.content, response.content)
+
+        request = APIRequestFactory().get('/test-resources/1/')
+        response = await AsyncTestResourceViewSet.as_view({'get': 'retrieve'})(request, pk=1)
+        expected = await sync_to_async(self.client.get)('/test-resources/1/')
+        self.assertEqual(expected.content, response.content)
+
+        request = APIRequestFactory().get('/test-resources/0/')
+        response = await AsyncTestResourceViewSet.as_view({'get': 'retrieve'})(request, pk=0)
+        self.assertEqual(404, response.status_code)
+
+
+@skipUnless(importlib.util.find_spec('orjson'), 'orjson is not installed')
+class JsonBackendTest(SimpleTestCase):
+    data = ReturnDict({
+        LINKS_FIELD_NAME: {'self': {'href': Hyperlink('http://testserver/resources/1/', 'resource')}},
+        'decimal': decimal.Decimal('1.25'),
+        'created': datetime.datetime(2020, 1, 2, 3, 4, 5, 6000, tzinfo=datetime.timezone.utc),
+        'date': datetime.date(2020, 1, 2),
+        'uuid': uuid.UUID('12345678123456781234567812345678'),
+        'lazy': lazystr('lazy'),
+        'separators': 'line\u2028paragraph\u2029',
+        'unicode': '\xfcber',
+        1: [1, 2.5, None, True],
+    }, serializer=None)
+
+    def render(self, backend, accepted_media_type=None):
+        with mock.patch.object(JsonHalRenderer, 'json_backend', backend):
+            return JsonHalRenderer().render(self.data, accepted_media_type)
+
+    def test_renders_like_stdlib(self):
+        orjson_backend = get_json_backend('orjson')
+        self.assertEqual(self.render(None), self.render(orjson_backend))
+        indented = 'application/hal+json; indent=2'
+        self.assertEqual(self.render(None, indented), self.render(orjson_backend, indented))
+
+    def test_falls_back_to_stdlib(self):
+        self.assertIsNone(get_json_backend('json'))
+        with mock.patch.object(JsonHalRenderer, 'json_backend', get_json_backend('orjson')):
+            # orjson does not support integers above 64 bit
+            self.assertEqual(b'{"big":1180591620717411303424}', JsonHalRenderer().render({'big': 2 ** 70}))
+
+    def test_non_finite_floats(self):
+        data = {'nan': float('nan'), 'inf': float('inf')}
+        with self.assertRaises(ValueError):
+            JsonHalRenderer().render(data)
+        # orjson can't reject them
+        with mock.patch.object(JsonHalRenderer, 'json_backend', get_json_backend('orjson')):
+            self.assertEqual(b'{"nan":null,"inf":null}', JsonHalRenderer().render(data))
+
+    def test_parse(self):
+        with mock.patch.object(JsonHalParser, 'json_backend', get_json_backend('orjson')):
+            parsed = JsonHalParser().parse(io.BytesIO(self.render(None)))
+        self.assertEqual(json.loads(self.render(None).decode()), parsed)
+
+
+class ContentTypeTest(SimpleTestCase):
+
+    def test_is_hal_content_type(self):
+        for content_type in ('application/hal+json', 'application/hal+json; charset=UTF-8',
+                             'Application/HAL+JSON;charset="utf-8"', 'application/hal+json; profile=x; charset=utf8'):
+            self.assertTrue(is_hal_content_type(content_type), content_type)
+        for content_type in (None, '', 'application/json', 'application/hal+jsonx',
+                             'application/hal+json; charset=latin-1'):
+            self.assertFalse(is_hal_content_type(content_type), content_type)
+
+
+class JsonHalStreamingParserTest(SimpleTestCase):
+
+    def parse(self, content, read_size=7):
+        parser = JsonHalStreamingParser()
+        parser.read_size = read_size
+        return parser.parse(io.BytesIO(content.encode()), parser_context={'encoding': 'utf-8'})
+
+    def test_parse_items_incrementally(self):
+        document = {
+            LINKS_FIELD_NAME: {'self': {'href': '/items/'}},
+            EMBEDDED_FIELD_NAME: {
+                'before': [1, 2],
+                'items': [{'name': 'Ünïcödé {}'.format(i), 'number': 12345.678 * i, 'flags': [True, None]}
+                          for i in range(10)] + [123456789, 'last'],
+                'after': {},
+            },
+            'count': 12,
+        }
+        content = json.dumps(document, ensure_ascii=False, indent=2)
+        stream = JsonHalStreamingParser().parse(io.BytesIO(content.encode()))
+        self.assertIsInstance(stream, HalItemStream)
+        stream = self.parse(content)
+        self.assertEqual({LINKS_FIELD_NAME: document[LINKS_FIELD_NAME], EMBEDDED_FIELD_NAME: {'before': [1, 2]}},
+                         stream.document)
+
+        chunks = list(stream.chunks(4))
+        self.assertEqual([4, 4, 4], [len(chunk) for chunk in chunks])
+        self.assertEqual(document[EMBEDDED_FIELD_NAME]['items'], [item for chunk in chunks for item in chunk])
+        self.assertEqual(12, stream.document['count'])
+        self.assertEqual({}, stream.document[EMBEDDED_FIELD_NAME]['after'])
+
+        self.assertEqual([], list(self.parse('{"_embedded": {"items": []}}')))
+
+    def test_parse_other_documents(self):
+        for document in ({'name': 'Single', '_embedded': {'related': {'name': 'Related'}}}, {'items': [1]},
+                         {'_embedded': {'items': {}}}, [1, 2], 'string', 1.5, {}):
+            self.assertEqual(document, self.parse(json.dumps(document)))
+
+    def test_parse_errors(self):
+        for content in ('', '{"name": }', '{"name": 1} 2', '{"_embedded": {"items": []}', '[1, 2', 'NaN'):
+            with self.assertRaises(ParseError, msg=content):
+                list(self.parse(content))
+        stream = self.parse('{"_embedded": {"items": [{"name": "Valid"}, {"name": "Invalid" ]}}')
+        self.assertEqual([{'name': 'Valid'}], next(stream.chunks(1)))
+        with self.assertRaises(ParseError):
+            list(stream)
+
+    def test_parse_values_split_by_reads(self):
+        items = [1.5, 2e-3, -10, 'aé', True, None, {'name': 'Split'}]
+        self.assertEqual(items, list(self.parse(json.dumps({'_embedded': {'items': items}}), read_size=1)))
+
+    def test_parse_error_reads_no_further(self):
+        content = ('{"_embedded": {"items": [{"name": invalid, "padding": "' + 'x' * 10000 + '"}]}}').encode()
+        body = io.BytesIO(content)
+        parser = JsonHalStreamingParser()
+        parser.read_size = 7
+        stream = parser.parse(body, parser_context={'encoding': 'utf-8'})
+        with self.assertRaises(ParseError):
+            list(stream)
+        self.assertLess(body.tell(), 100)
+
+
+class HalPaginationTest(TestCase):
+    TESTSERVER_URL = "http://testserver"
+
+    def setUp(self):
+        for i in range(0, 50):
+            AbundantResource.objects.create(name="Abundant Resource {}".format(i))
+
+    def paginate(self, pagination, path, **attrs):
+        for name, value in attrs.items():
+            setattr(pagination, name, value)
+        request = Request(APIRequestFactory().get(path))
+        page = pagination.paginate_queryset(AbundantResource.objects.order_by('pk'), request)
+        return page, pagination.get_paginated_response({LINKS_FIELD_NAME: {}}).data
+
+    def test_uncounted_page_number_pagination(self):
+        with self.assertNumQueries(1):
+            page, data = self.paginate(HalPageNumberPagination(), '/?page=4', count_strategy='none')
+        self.assertEqual(10, len(page))
+        self.assertNotIn('count', data)
+        self.assertIn('next', data[LINKS_FIELD_NAME])
+        self.assertIn('previous', data[LINKS_FIELD_NAME])
+
+        page, data = self.paginate(HalPageNumberPagination(), '/?page=5', count_strategy='none')
+        self.assertEqual(10, len(page))
+        self.assertNotIn('next', data[LINKS_FIELD_NAME])
+        with self.assertRaises(NotFound):
+            self.paginate(HalPageNumberPagination(), '/?page=6', count_strategy='none')
+
+    def test_uncounted_limit_offset_pagination(self):
+        with self.assertNumQueries(1):
+            page, data = self.paginate(HalLimitOffsetPagination(), '/?offset=30', count_strategy='none')
+        self.assertEqual(10, len(page))
+        self.assertNotIn('count', data)
+        self.assertIn('next', data[LINKS_FIELD_NAME])
+
+        page, data = self.paginate(HalLimitOffsetPagination(), '/?offset=45', count_strategy='none')
+        self.assertEqual(5, len(page))
+        self.assertNotIn('next', data[LINKS_FIELD_NAME])
+        self.assertIn('previous', data[LINKS_FIELD_NAME])
+
+    def test_cached_count(self):
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.paginate(HalPageNumberPagination(), '/', count_strategy='cached')
+        with self.assertNumQueries(1):
+            page, data = self.paginate(HalLimitOffsetPagination(), '/?offset=10', count_strategy='cached')
+        self.assertEqual(50, data['count'])
+
+    def test_estimated_count(self):
+        page, data = self.paginate(HalPageNumberPagination(), '/?page=5', count_strategy='estimated',
+                                   count_estimator=lambda queryset: 10 ** 6)
+        self.assertEqual(10 ** 6, data['count'])
+        # links don't depend on the estimate
+        self.assertNotIn('next', data[LINKS_FIELD_NAME])
+
+        # querysets the estimator can't handle are counted exactly
+        page, data = self.paginate(HalPageNumberPagination(), '/', count_strategy='estimated')
+        self.assertEqual(50, data['count'])
+
+    def test_exact_count(self):
+        with self.assertNumQueries(2):
+            page, data = self.paginate(HalLimitOffsetPagination(), '/?offset=40')
+        self.assertEqual(50, data['count'])
+        self.assertNotIn('next', data[LINKS_FIELD_NAME])
+
+    def test_page_number_links(self):
+        page, data = self.paginate(HalPageNumberPagination(), '/?page=3&name=a')
+        self.assertEqual({
+            'next': {'href': 'http://testserver/?name=a&page=4'},
+            'previous': {'href': 'http://testserver/?name=a&page=2'},
+            'first': {'href': 'http://testserver/?name=a'},
+            'last': {'href': 'http://testserver/?name=a&page=5'},
+            'page': {'href': 'http://testserver/?name=a{&page}', 'templated': True},
+        }, data[LINKS_FIELD_NAME])
+        self.assertEqual(10, data['page_size'])
+
+        page, data = self.paginate(HalPageNumberPagination(), '/?page=2', count_strategy='none')
+        self.assertEqual({'next', 'previous', 'first', 'page'}, set(data[LINKS_FIELD_NAME]))
+        self.assertEqual('http://testserver/', data[LINKS_FIELD_NAME]['previous']['href'])
+        self.assertEqual('http://testserver/{?page}', data[LINKS_FIELD_NAME]['page']['href'])
+
+    def test_limit_offset_links(self):
+        page, data = self.paginate(HalLimitOffsetPagination(), '/?offset=15&limit=10')
+        self.assertEqual({
+            'next': {'href': 'http://testserver/?limit=10&offset=25'},
+            'previous': {'href': 'http://testserver/?limit=10&offset=5'},
+            'first': {'href': 'http://testserver/?limit=10'},
+            'last': {'href': 'http://testserver/?limit=10&offset=40'},
+            'page': {'href': 'http://testserver/{?limit,offset}', 'templated': True},
+        }, data[LINKS_FIELD_NAME])
+
+    def test_keyset_seek_filter(self):
+        ordering = [('name', True), ('name', True), ('id', False)]
+        self.assertEqual(
+            Q(name__lt='b') | Q(name__lt='a') & Q(name='b') | Q(id__gt=2) & Q(name='b') & Q(name='a'),
+            HalKeysetPagination.get_seek_filter(ordering, ['b', 'a', 2]))
+
+    def test_keyset_pagination(self):
+        for resource in AbundantResource.objects.all():
+            resource.name = 'group {}'.format(resource.pk % 3)
+            resource.save()
+        expected = list(AbundantResource.objects.order_by('-name', '-pk').values_list('pk', flat=True))
+
+        pks, path = [], '/'
+        while path:
+            with self.assertNumQueries(1):
+                page, data = self.paginate(HalKeysetPagination(), path, ordering='-name', page_size=7)
+            pks.extend(resource.pk for resource in page)
+            path = data[LINKS_FIELD_NAME].get('next', {}).get('href')
+        self.assertEqual(expected, pks)
+        self.assertNotIn('previous', self.paginate(HalKeysetPagination(), '/', ordering='-name')[1][LINKS_FIELD_NAME])
+
+        # walk back from the last page
+        pks = [resource.pk for resource in page]
+        path = data[LINKS_FIELD_NAME]['previous']['href']
+        while path:
+            page, data = self.paginate(HalKeysetPagination(), path, ordering='-name', page_size=7)
+            pks[:0] = [resource.pk for resource in page]
+            self.assertEqual(7, len(page))
+            path = data[LINKS_FIELD_NAME].get('previous', {}).get('href')
+        self.assertEqual(expected, pks)
+        self.assertEqual('http://testserver/', data[LINKS_FIELD_NAME]['first']['href'])
+
+    def test_keyset_pagination_invalid_key(self):
+        with self.assertRaises(NotFound):
+            self.paginate(HalKeysetPagination(), '/?after=invalid')
+        with self.assertRaises(NotFound):
+            self.paginate(HalKeysetPagination(), '/?after=WyJhIl0')
+
+    def test_paginate_list_document_in_place(self):
+        pagination = HalPageNumberPagination()
+        request = Request(APIRequestFactory().get('/?page=2'))
+        page = pagination.paginate_queryset(AbundantResource.objects.order_by('pk'), request)
+        serializer = AbundantResourceSerializer(page, many=True, context={'request': request})
+        with mock.patch.object(request._request, 'build_absolute_uri',
+                               wraps=request._request.build_absolute_uri) as build_absolute_uri:
+            data = serializer.data
+            call_count = build_absolute_uri.call_count
+            self.assertIs(data, serializer.data)
+        self.assertEqual(call_count, build_absolute_uri.call_count)
+
+        paginated = pagination.get_paginated_response(data).data
+        self.assertIs(data, paginated)
+        self.assertIs(serializer, paginated.serializer)
+        self.assertEqual(10, len(paginated[EMBEDDED_FIELD_NAME]['items']))
+        self.assertEqual({'self', 'next', 'previous', 'first', 'last', 'page'}, set(paginated[LINKS_FIELD_NAME]))
+        self.assertEqual(10, paginated['page_size'])
+
+    def test_cursor_links(self):
+        pages = self.client.get("/abundant-resources/").data
+        next_link = pages[LINKS_FIELD_NAME]["next"]["href"]
+        pages = self.client.get(next_link).data
+        self.assertEqual(self.TESTSERVER_URL + '/abundant-resources/', pages[LINKS_FIELD_NAME]['first']['href'])
+        self.assertNotIn('page', pages[LINKS_FIELD_NAME])
@@ -1,4 +1,4 @@
-from django.conf.urls import url
+from django.urls import path, register_converter
 from rest_framework.routers import DefaultRouter
 
 from .views import (AbundantResourceViewSet, CustomResourceViewSet,
@@ -6,19 +6,47 @@ from .views import (AbundantResourceViewSet, CustomResourceViewSet,
                     RelatedResource3ViewSet, TestResourceViewSet,
                     URLResourceViewSet, FileResourceViewSet,
                     SlugRelatedResourceViewSet, HalFileResourceViewSet,
-                    AbundantUnpagedViewSet
+                    AbundantUnpagedViewSet, PlannedTestResourceViewSet,
+                    AbundantStreamedViewSet, StreamedTestResourceViewSet,
+                    ConditionalTestResourceViewSet, WritableCustomResourceViewSet,
+                    StreamingWritableCustomResourceViewSet
                     )
 
+
+class PaddedIntConverter(object):
+    regex = '[0-9]+'
+
+    def to_python(self, value):
+        return int(value)
+
+    def to_url(self, value):
+        return '{:04d}'.format(int(value))
+
+
+register_converter(PaddedIntConverter, 'pad')
+
 router = DefaultRouter()
 router.register(r'test-resources', TestResourceViewSet)
+router.register(r'planned-test-resources', PlannedTestResourceViewSet, basename='planned-testresource')
+router.register(r'conditional-test-resources', ConditionalTestResourceViewSet, basename='conditional-testresource')
+router.register(r'streamed-test-resources', StreamedTestResourceViewSet, basename='streamed-testresource')
 router.register(r'related-resources-1', RelatedResource1ViewSet)
 router.register(r'related-resources-2', RelatedResource2ViewSet)
 router.register(r'related-resources-3', RelatedResource3ViewSet)
 router.register(r'custom-resources', CustomResourceViewSet)
+router.register(r'writable-custom-resources', WritableCustomResourceViewSet, basename='writable-customresource')
+router.register(r'streaming-writable-custom-resources', StreamingWritableCustomResourceViewSet,
+                basename='streaming-writable-customresource')
 router.register(r'slug-resources', SlugRelatedResourceViewSet)
 router.register(r'abundant-resources', AbundantResourceViewSet)
-router.register(r'abundant-unpaged', AbundantUnpagedViewSet)
+router.register(r'abundant-unpaged', AbundantUnpagedViewSet, basename='unpaged-abundantresource')
+router.register(r'abundant-streamed', AbundantStreamedViewSet, basename='streamed-abundantresource')
 router.register(r'url-resources', URLResourceViewSet)
 router.register(r'file-resources', FileResourceViewSet)
-router.register(r'hal-file-resources', HalFileResourceViewSet)
-urlpatterns = router.urls
+router.register(r'hal-file-resources', HalFileResourceViewSet, basename='hal-fileresource')
+urlpatterns = router.urls + [
+    path('padded-abundant-resources/<pad:pk>/', AbundantResourceViewSet.as_view({'get': 'retrieve'}),
+         name='padded-abundantresource-detail'),
+    path('int-abundant-resources/<int:pk>/', AbundantResourceViewSet.as_view({'get': 'retrieve'}),
+         name='int-abundantresource-detail'),
+]
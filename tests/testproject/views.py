@@ -1,4 +1,6 @@
-from drf_hal_json.views import HalCreateModelMixin
+from drf_hal_json.parsers import JsonHalStreamingParser
+from drf_hal_json.views import (HalConditionalListMixin, HalConditionalRetrieveMixin, HalCreateModelMixin,
+                                HalQueryPlanMixin, HalStreamingCreateMixin, HalStreamingListMixin)
 from rest_framework.viewsets import ModelViewSet
 
 from .models import (AbundantResource, CustomResource, RelatedResource1,
@@ -9,7 +11,8 @@ from .serializers import (AbundantResourceSerializer, CustomResourceSerializer,
                           RelatedResource1Serializer,
                           RelatedResource2Serializer,
                           RelatedResource3Serializer, TestResourceSerializer,
-                          FileSerializer, SlugRelatedResourceSerializer, HalFileSerializer)
+                          FileSerializer, SlugRelatedResourceSerializer, HalFileSerializer,
+                          WritableCustomResourceSerializer)
 
 
 class CustomResourceViewSet(HalCreateModelMixin, ModelViewSet):
@@ -17,11 +20,30 @@ class CustomResourceViewSet(HalCreateModelMixin, ModelViewSet):
     queryset = CustomResource.objects.all()
 
 
+class WritableCustomResourceViewSet(CustomResourceViewSet):
+    serializer_class = WritableCustomResourceSerializer
+    update_by_self_link = True
+
+
+class StreamingWritableCustomResourceViewSet(HalStreamingCreateMixin, WritableCustomResourceViewSet):
+    parser_classes = (JsonHalStreamingParser,)
+    ingest_chunk_size = 2
+
+
 class TestResourceViewSet(HalCreateModelMixin, ModelViewSet):
     serializer_class = TestResourceSerializer
     queryset = TestResource.objects.all()
 
 
+class PlannedTestResourceViewSet(HalQueryPlanMixin, TestResourceViewSet):
+    pass
+
+
+class ConditionalTestResourceViewSet(HalConditionalRetrieveMixin, HalConditionalListMixin, TestResourceViewSet):
+    last_modified_field = 'created'
+    etag_fields = ('related_resource_1__created', 'related_resource_2__created')
+
+
 class RelatedResource1ViewSet(HalCreateModelMixin, ModelViewSet):
     serializer_class = RelatedResource1Serializer
     queryset = RelatedResource1.objects.all()
@@ -52,6 +74,14 @@ class AbundantUnpagedViewSet(AbundantResourceViewSet):
     pagination_class = None
 
 
+class AbundantStreamedViewSet(HalStreamingListMixin, AbundantUnpagedViewSet):
+    stream_chunk_size = 7
+
+
+class StreamedTestResourceViewSet(HalStreamingListMixin, PlannedTestResourceViewSet):
+    pagination_class = None
+
+
 class URLResourceViewSet(HalCreateModelMixin, ModelViewSet):
     serializer_class = HyperlinkedPropertySerializer
     queryset = URLResource.objects.all()